@@ -0,0 +1,224 @@
+# AX.25 address encoding and header decoding shared by the tnc-tools scripts.
+
+import random
+import string
+
+# Control field frame types.
+FRAME_I = 'I'
+FRAME_S = 'S'
+FRAME_U = 'U'
+
+# Unnumbered frame names, keyed by the control byte without the P/F bit.
+U_FRAME_NAMES = {
+	0x6F: 'SABME',
+	0x2F: 'SABM',
+	0x43: 'DISC',
+	0x0F: 'DM',
+	0x63: 'UA',
+	0x87: 'FRMR',
+	0x03: 'UI',
+	0xAF: 'XID',
+	0xE3: 'TEST',
+}
+
+PID_NAMES = {
+	0x01: 'ISO 8208',
+	0x06: 'Compressed TCP/IP',
+	0x07: 'Uncompressed TCP/IP',
+	0x08: 'Segmentation Fragment',
+	0xC3: 'TEXNET',
+	0xC4: 'Link Quality Protocol',
+	0xCA: 'Appletalk',
+	0xCC: 'ARPA Internet Protocol',
+	0xCD: 'ARPA Address Resolution',
+	0xCF: 'TheNET (NET/ROM)',
+	0xF0: 'No Layer 3',
+	0xFF: 'Escape',
+}
+
+def _ControlType(control):
+	if control & 1 == 0:
+		return FRAME_I
+	if control & 3 == 1:
+		return FRAME_S
+	return FRAME_U
+
+# Lookup tables indexed by control or PID byte.
+CONTROL_TYPES = [_ControlType(control) for control in range(256)]
+CONTROL_NAMES = [U_FRAME_NAMES.get(control & 0xEF, '') if CONTROL_TYPES[control] == FRAME_U else '' for control in range(256)]
+# I and UI frames carry a PID byte.
+CONTROL_HAS_PID = [CONTROL_TYPES[control] == FRAME_I or control & 0xEF == 0x03 for control in range(256)]
+PID_NAME_TABLE = [PID_NAMES.get(pid, '') for pid in range(256)]
+# Shifted address byte to callsign character, spaces and nulls are dropped.
+CALLSIGN_CHARS = [chr(value >> 1) if (value >> 1) not in (0, 0x20) else '' for value in range(256)]
+
+# Longest address field, destination, source and 8 digipeaters.
+MAX_ADDRESSES = 10
+ADDRESS_LENGTH = 7
+
+# SSID byte bits, the command or has-been-repeated bit, the two reserved bits
+# and the address extension bit that marks the last address.
+SSID_COMMAND = 0x80
+SSID_RESERVED = 0x60
+SSID_LAST = 0x01
+# The SSID byte flags the frame generators use for destination and source.
+DESTINATION_FLAGS = SSID_COMMAND | SSID_RESERVED
+SOURCE_FLAGS = SSID_RESERVED | SSID_LAST
+MAX_SSID = 15
+
+def ParseCallsign(text):
+	# Returns (callsign, ssid) for 'CALL' or 'CALL-SSID'. The callsign is upper
+	# cased, SSIDs above 15 are clamped to 15. Raises ValueError for a callsign
+	# longer than 6 characters or an SSID that isn't one or two digits.
+	call, separator, ssid_text = text.upper().partition('-')
+	if len(call) > 6:
+		raise ValueError(f'Callsign {text} is longer than 6 characters')
+	if len(ssid_text) == 0:
+		ssid = 0
+	elif ssid_text.isdigit() and len(ssid_text) <= 2:
+		ssid = min(int(ssid_text), MAX_SSID)
+	else:
+		raise ValueError(f'Invalid SSID in {text}')
+	return call, ssid
+
+# Encoded address fields, keyed by (text, flags).
+_encode_cache = {}
+_ENCODE_CACHE_SIZE = 4096
+
+def EncodeAddress(text, flags=0):
+	# Returns the 7 byte address field for 'CALL-SSID': the callsign shifted
+	# left one bit and padded with spaces, then the SSID byte with flags set.
+	key = (text, flags)
+	field = _encode_cache.get(key)
+	if field is None:
+		call, ssid = ParseCallsign(text)
+		field = bytes(character << 1 for character in call.ljust(6).encode('ascii')) + bytes([(ssid << 1) | flags])
+		if len(_encode_cache) >= _ENCODE_CACHE_SIZE:
+			_encode_cache.clear()
+		_encode_cache[key] = field
+	return field
+
+_SHIFTED_CALLSIGN_CHARACTERS = [character << 1 for character in (string.ascii_uppercase + string.digits).encode('ascii')]
+ADDRESS_PAIR_LENGTH = 2 * ADDRESS_LENGTH
+
+def RandomAddressPairs(count, destination_flags=DESTINATION_FLAGS, source_flags=SOURCE_FLAGS, rng=random):
+	# Returns count destination and source address pairs as one buffer of
+	# count * 14 bytes. Callsigns are 6 random letters and digits, SSIDs are 0
+	# to 9. Draws from rng, so a seeded generator gives a repeatable sequence.
+	characters = rng.choices(_SHIFTED_CALLSIGN_CHARACTERS, k=12 * count)
+	destination_ssids = rng.choices([(ssid << 1) | destination_flags for ssid in range(10)], k=count)
+	source_ssids = rng.choices([(ssid << 1) | source_flags for ssid in range(10)], k=count)
+	pairs = bytearray(ADDRESS_PAIR_LENGTH * count)
+	for position in range(6):
+		pairs[position::ADDRESS_PAIR_LENGTH] = bytes(characters[position::12])
+		pairs[ADDRESS_LENGTH + position::ADDRESS_PAIR_LENGTH] = bytes(characters[6 + position::12])
+	pairs[6::ADDRESS_PAIR_LENGTH] = bytes(destination_ssids)
+	pairs[13::ADDRESS_PAIR_LENGTH] = bytes(source_ssids)
+	return bytes(pairs)
+
+class AX25Header:
+	# A decoded AX.25 header. Addresses are 'CALL-SSID' strings, via is a list
+	# of (address, H bit) pairs. ns and nr are None where the frame type has no
+	# such field, pid is None for frames without a PID byte. payload_offset is
+	# the index of the first payload byte in the decoded frame.
+	__slots__ = ('destination', 'source', 'via', 'control', 'frame_type', 'control_name', 'ns', 'nr', 'poll_final', 'pid', 'pid_name', 'payload_offset')
+
+	def __init__(self, destination, source, via, control, pid, payload_offset):
+		self.destination = destination
+		self.source = source
+		self.via = via
+		self.control = control
+		self.frame_type = CONTROL_TYPES[control]
+		self.control_name = CONTROL_NAMES[control]
+		self.poll_final = (control >> 4) & 1
+		if self.frame_type == FRAME_I:
+			self.ns = (control >> 1) & 7
+		else:
+			self.ns = None
+		if self.frame_type == FRAME_U:
+			self.nr = None
+		else:
+			self.nr = (control >> 5) & 7
+		self.pid = pid
+		if pid is None:
+			self.pid_name = ''
+		else:
+			self.pid_name = PID_NAME_TABLE[pid]
+		self.payload_offset = payload_offset
+
+def ControlIndex(frame, offset=1):
+	# Index of the control byte found by walking the address extension bits,
+	# without decoding, or -1 when the frame has no valid header.
+	count = len(frame)
+	if count - offset < 2 * ADDRESS_LENGTH + 1 or frame[offset + 6] & 1:
+		return -1
+	index = offset + 2 * ADDRESS_LENGTH - 1
+	last = offset + MAX_ADDRESSES * ADDRESS_LENGTH - 1
+	while index < count:
+		if frame[index] & 1:
+			if index + 1 < count:
+				return index + 1
+			return -1
+		if index >= last:
+			return -1
+		index += ADDRESS_LENGTH
+	return -1
+
+# Decoded address strings, keyed by the 7 address bytes.
+_address_cache = {}
+_ADDRESS_CACHE_SIZE = 4096
+
+def DecodeAddress(field):
+	# Returns 'CALL-SSID' for a 7 byte address field.
+	address = _address_cache.get(field)
+	if address is None:
+		address = ''.join([CALLSIGN_CHARS[value] for value in field[:6]]) + '-' + str((field[6] >> 1) & 0xF)
+		if len(_address_cache) >= _ADDRESS_CACHE_SIZE:
+			_address_cache.clear()
+		_address_cache[bytes(field)] = address
+	return address
+
+def DecodeAX25Header(frame, offset=1):
+	# Decodes the header starting at offset, which skips the KISS type byte by
+	# default. Returns an AX25Header, or None when the frame is too short for a
+	# header or the address field never ends.
+	frame = bytes(frame)
+	count = len(frame)
+	if count - offset < 2 * ADDRESS_LENGTH + 1:
+		return None
+	addresses = []
+	index = offset
+	while True:
+		if index + ADDRESS_LENGTH > count or len(addresses) == MAX_ADDRESSES:
+			return None
+		field = frame[index:index + ADDRESS_LENGTH]
+		addresses.append(field)
+		index += ADDRESS_LENGTH
+		if field[6] & 1:
+			break
+	if len(addresses) < 2 or index >= count:
+		return None
+	control = frame[index]
+	index += 1
+	pid = None
+	if CONTROL_HAS_PID[control]:
+		if index >= count:
+			return None
+		pid = frame[index]
+		index += 1
+	via = [(DecodeAddress(field), bool(field[6] & 0x80)) for field in addresses[2:]]
+	return AX25Header(DecodeAddress(addresses[0]), DecodeAddress(addresses[1]), via, control, pid, index)
+
+def FormatAX25Header(header, delimiter=', '):
+	# One line summary in the kiss-listen format. Digipeaters that have
+	# repeated the frame are marked with '*'.
+	fields = ['To:' + header.destination, 'From:' + header.source]
+	for address, repeated in header.via:
+		if repeated:
+			fields.append('Via:' + address + '* ')
+		else:
+			fields.append('Via:' + address)
+	fields.append(f'Control: {hex(header.control)} {header.control_name}')
+	if header.pid is not None:
+		fields.append(f'PID: {hex(header.pid)} {header.pid_name}')
+	return delimiter.join(fields)
@@ -0,0 +1,61 @@
+# Frame sources for the batch generators, separating frame generation from
+# the timed transmit loop.
+
+import threading
+import queue
+import time
+
+CORPUS_MODES = ['inline', 'prebuild', 'stream']
+
+class FrameSource:
+	# Iterates over count frames produced by build_frame(index).
+	#   inline   builds each frame when the transmit loop asks for it.
+	#   prebuild builds every frame up front, before the first is sent.
+	#   stream   builds frames on a producer thread into a bounded queue of depth
+	#            frames, so generation overlaps the waits between sends.
+	# generation_time is the total time spent inside build_frame.
+
+	def __init__(self, build_frame, count, mode='inline', depth=64):
+		if mode not in CORPUS_MODES:
+			raise ValueError(f'Unknown corpus mode {mode}')
+		self.build_frame = build_frame
+		self.count = count
+		self.mode = mode
+		self.generation_time = 0.0
+		self._frames = None
+		self._queue = None
+		if mode == 'prebuild':
+			self._frames = [self._Build(index) for index in range(count)]
+		elif mode == 'stream':
+			self._queue = queue.Queue(maxsize=max(1, depth))
+			threading.Thread(target=self._Produce, daemon=True).start()
+
+	def _Build(self, index):
+		start = time.perf_counter()
+		frame = self.build_frame(index)
+		self.generation_time += time.perf_counter() - start
+		return frame
+
+	def _Produce(self):
+		try:
+			for index in range(self.count):
+				self._queue.put((True, self._Build(index)))
+		except Exception as error:
+			self._queue.put((False, error))
+
+	def __iter__(self):
+		if self.mode == 'prebuild':
+			yield from self._frames
+		elif self.mode == 'stream':
+			for index in range(self.count):
+				ok, frame = self._queue.get()
+				if not ok:
+					raise frame
+				yield frame
+		else:
+			for index in range(self.count):
+				yield self._Build(index)
+
+def FormatGeneration(source):
+	rate = source.count / source.generation_time if source.generation_time > 0 else 0.0
+	return f'Generated {source.count} frames ({source.mode}) in {source.generation_time:.3f} s, {rate:.1f} frames/s.'
@@ -1,15 +1,149 @@
-import numpy as np
+import binascii
 
-def CalcCRC16(packet):
-	fcsval = np.uint16(0xFFFF)
-	CRC_poly = np.uint16(0x8408)
-	one = np.uint16(1)
+# CRC-16/X.25 (HDLC FCS): reflected polynomial 0x8408, init 0xFFFF, final xor 0xFFFF.
+CRC_POLY = 0x8408
+
+def _BuildCRCTable():
+	table = []
+	for i in range(256):
+		fcsval = i
+		for j in range(8):
+			if fcsval & 1:
+				fcsval = (fcsval >> 1) ^ CRC_POLY
+			else:
+				fcsval = fcsval >> 1
+		table.append(fcsval)
+	return tuple(table)
+
+# 256-entry table for the reflected (LSB first) CRC.
+CRC_TABLE = _BuildCRCTable()
+
+# binascii.crc_hqx is a C table-driven CRC-16/CCITT that runs MSB first. Feeding
+# it bit-reversed bytes and bit-reversing the result gives the LSB first X.25 CRC.
+REVERSE_BITS = bytes(int(f'{i:08b}'[::-1], 2) for i in range(256))
+
+def _Reverse16(value):
+	return (REVERSE_BITS[value & 0xFF] << 8) | REVERSE_BITS[value >> 8]
+
+def CalcCRC16Int(packet):
+	# packet may be bytes, bytearray, memoryview or a list of byte values.
+	if not isinstance(packet, (bytes, bytearray)):
+		packet = bytes(packet)
+	return _Reverse16(binascii.crc_hqx(packet.translate(REVERSE_BITS), 0xFFFF)) ^ 0xFFFF
+
+class CRC16:
+	# Incremental CRC-16/X.25 in the style of hashlib. Feed data with update() as
+	# it arrives, read the FCS with intdigest(), digest() or hexdigest(). copy()
+	# returns an independent object, so a fixed header can be hashed once and
+	# then extended per frame.
+	__slots__ = ('_register',)
+	digest_size = 2
+	name = 'crc16-x25'
+
+	def __init__(self, data=b''):
+		# The register is held bit reversed, the form binascii.crc_hqx works in.
+		self._register = 0xFFFF
+		if data:
+			self.update(data)
+
+	def update(self, data):
+		if not isinstance(data, (bytes, bytearray)):
+			data = bytes(data)
+		self._register = binascii.crc_hqx(data.translate(REVERSE_BITS), self._register)
+
+	def intdigest(self):
+		return _Reverse16(self._register) ^ 0xFFFF
+
+	def digest(self):
+		# The FCS goes on the air least significant byte first.
+		return self.intdigest().to_bytes(2, 'little')
+
+	def hexdigest(self):
+		return f'{self.intdigest():04x}'
+
+	def copy(self):
+		other = CRC16()
+		other._register = self._register
+		return other
+
+def CalcCRC16Table(packet):
+	# Pure Python table engine, kept as a reference for CalcCRC16Int.
+	fcsval = 0xFFFF
+	table = CRC_TABLE
 	for byte in packet:
-		for i in range(8):
-			fcsbit = np.bitwise_and(fcsval, one)
-			fcsval = np.right_shift(fcsval, 1)
-			if np.bitwise_xor(fcsbit, np.bitwise_and(byte,one)) != 0:
-				fcsval = np.bitwise_xor(fcsval, CRC_poly)
-			byte = np.right_shift(byte, 1)
-	fcs_val = np.bitwise_and(np.bitwise_not(fcsval), 0xFFFF)
-	return(hex(fcs_val))
+		fcsval = (fcsval >> 8) ^ table[(fcsval ^ byte) & 0xFF]
+	return fcsval ^ 0xFFFF
+
+def CalcCRC16(packet):
+	return(hex(CalcCRC16Int(packet)))
+
+def PadFrames(frames):
+	# Pack a list of byte strings into a zero padded 2-D uint8 array, one row per
+	# frame. Returns the array and the frame lengths.
+	import numpy as np
+	lengths = np.fromiter(map(len, frames), dtype=np.int64, count=len(frames))
+	max_len = int(lengths.max()) if len(frames) > 0 else 0
+	padded = np.zeros((len(frames), max_len), dtype=np.uint8)
+	padded[np.arange(max_len) < lengths[:, None]] = np.frombuffer(b''.join(frames), dtype=np.uint8)
+	return padded, lengths
+
+_batch_tables = None
+
+def _BatchTables(np):
+	# The byte table, plus a 65536-entry table that advances the CRC by two bytes
+	# at once. After two bytes every bit of the 16 bit register has been shifted
+	# out, so the new register depends only on (register ^ next two bytes).
+	global _batch_tables
+	if _batch_tables is None:
+		table8 = np.array(CRC_TABLE, dtype=np.uint16)
+		table16 = np.arange(65536, dtype=np.uint16)
+		for i in range(2):
+			table16 = (table16 >> 8) ^ table8[table16 & 0xFF]
+		_batch_tables = (table8, table16)
+	return _batch_tables
+
+def _CalcCRC16Block(np, data, lengths):
+	table8, table16 = _BatchTables(np)
+	# Sort frames longest first so the frames still active at any byte offset are
+	# a prefix of the block.
+	order = np.argsort(-lengths, kind='stable')
+	sorted_lengths = lengths[order]
+	max_len = int(sorted_lengths[0]) if len(order) > 0 else 0
+	width = min(max_len, data.shape[1])
+	sorted_data = np.zeros((len(order), max_len + (max_len & 1)), dtype=np.uint8)
+	sorted_data[:, :width] = data[order, :width]
+	# One row per pair of byte offsets, so each pass reads contiguous memory.
+	words = np.ascontiguousarray(sorted_data.view('<u2').T)
+	# Number of frames holding at least 1..max_len bytes.
+	active = np.searchsorted(-sorted_lengths, -np.arange(1, max_len + 2), side='right')
+	fcsval = np.full(len(order), 0xFFFF, dtype=np.uint16)
+	for k in range(words.shape[0]):
+		pairs = active[2 * k + 1]
+		singles = active[2 * k]
+		if pairs > 0:
+			working = fcsval[:pairs]
+			np.bitwise_xor(working, words[k, :pairs], out=working)
+			np.take(table16, working, out=working)
+		if singles > pairs:
+			# Odd length frames ending at this offset take one last byte step.
+			working = fcsval[pairs:singles]
+			fcsval[pairs:singles] = (working >> 8) ^ table8[(working ^ sorted_data[pairs:singles, 2 * k]) & 0xFF]
+	result = np.empty_like(fcsval)
+	result[order] = fcsval ^ 0xFFFF
+	return result
+
+def CalcCRC16Batch(frames, lengths, block_size=4096):
+	# Compute the FCS of many frames at once. frames is a padded 2-D uint8 array
+	# with one frame per row, lengths the length of each frame, as PadFrames
+	# returns them. Returns a uint16 array, one FCS per frame. Frames already in
+	# a list are faster through CalcCRC16Int one by one, padding them costs more
+	# than the vectorized CRC saves. Frames are processed block_size at a time to
+	# keep the working set in cache.
+	import numpy as np
+	frames = np.asarray(frames, dtype=np.uint8)
+	lengths = np.asarray(lengths, dtype=np.int64)
+	result = np.empty(len(frames), dtype=np.uint16)
+	for start in range(0, len(frames), block_size):
+		stop = start + block_size
+		result[start:stop] = _CalcCRC16Block(np, frames[start:stop], lengths[start:stop])
+	return result
@@ -0,0 +1,70 @@
+# Duplicate frame detection for copies of one packet heard through
+# digipeaters.
+
+import collections
+import ax25
+
+def DedupeKey(frame):
+	# The frame content that is the same in every copy of a packet: destination,
+	# source, control, PID and payload. The via path is left out, because
+	# digipeaters set its H bits, along with the source extension bit, which
+	# depends on whether there is a via path at all. Frames without a valid
+	# header are keyed on their whole content. The key is the content itself,
+	# not a hash of it, so different frames can never be taken for copies.
+	control_index = ax25.ControlIndex(frame)
+	if control_index < 0:
+		return bytes(frame)
+	return (bytes(frame[1:14]), frame[14] & 0xFE, bytes(frame[control_index:]))
+
+class DuplicateIndex:
+	# Remembers frames for window seconds from the first copy, up to
+	# max_entries, so a packet sent again after the window, like a fixed beacon,
+	# shows again even if copies kept arriving. Entries are kept in least
+	# recently seen order, so when full the least recently seen entry is evicted
+	# from the front, and expired entries are cleared from the front. Memory
+	# stays bounded however long the index runs.
+
+	def __init__(self, window=30.0, max_entries=4096):
+		self.window = window
+		self.max_entries = max_entries
+		# Key to [first seen time, repeat count].
+		self._entries = collections.OrderedDict()
+		self.unique_count = 0
+		self.duplicate_count = 0
+		self.evicted_count = 0
+
+	def check(self, frame, now):
+		# Returns how many times frame has been seen within the window before
+		# this copy, 0 for a new frame. now is in seconds.
+		self._Expire(now)
+		key = DedupeKey(frame)
+		entry = self._entries.get(key)
+		if entry is not None and now - entry[0] >= self.window:
+			# Expired, but kept behind a more recently seen entry.
+			del self._entries[key]
+			entry = None
+		if entry is None:
+			if len(self._entries) >= self.max_entries:
+				self._entries.popitem(last=False)
+				self.evicted_count += 1
+			self._entries[key] = [now, 0]
+			self.unique_count += 1
+			return 0
+		entry[1] += 1
+		self._entries.move_to_end(key)
+		self.duplicate_count += 1
+		return entry[1]
+
+	def _Expire(self, now):
+		# Clears expired entries from the front. Entries are in last seen order,
+		# not first seen order, so an expired entry can sit behind a live one for
+		# a while. check() treats such an entry as new.
+		entries = self._entries
+		while entries:
+			key, entry = next(iter(entries.items()))
+			if now - entry[0] < self.window:
+				return
+			del entries[key]
+
+	def __len__(self):
+		return len(self._entries)
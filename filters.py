@@ -0,0 +1,255 @@
+# Frame filter expressions, compiled once into a predicate over the raw KISS
+# frame so frames can be dropped before they are decoded or rendered.
+#
+# An expression is terms joined with and, or, not and parentheses, e.g.
+#   src=KK4HEJ-* and pid=0xF0 and len>64
+# Terms:
+#   src, dst, via   callsign with = or !=. CALL matches SSID 0, CALL-n SSID n,
+#                   CALL-* any SSID, a trailing * on the call matches a prefix
+#                   (KK4*). via matches any digipeater in the path.
+#   call            src or dst.
+#   type            = or != I, S, U or an unnumbered frame name (UI, SABM, ...).
+#   pid, control    byte value, compared with = != < <= > >=.
+#   len             frame length as shown in the byte count, same operators.
+#   port            KISS port number, same operators.
+# A term on a field the frame doesn't have (no valid header, no PID) is false.
+
+import operator
+import re
+import ax25
+
+COMPARISONS = {
+	'=': operator.eq,
+	'==': operator.eq,
+	'!=': operator.ne,
+	'<': operator.lt,
+	'<=': operator.le,
+	'>': operator.gt,
+	'>=': operator.ge,
+}
+
+_TOKEN = re.compile(r'\s*(?:(?P<paren>[()])|(?P<term>(?P<field>[A-Za-z]+)\s*(?P<op>>=|<=|!=|==|=|>|<)\s*(?P<value>[^\s()]+))|(?P<word>[^\s()]+))')
+
+# Offsets in the KISS frame, after the type byte.
+DESTINATION_OFFSET = 1
+SOURCE_OFFSET = 8
+
+def _ParseCallsign(value):
+	# Returns (shifted callsign bytes, exact, ssid) where exact is False for a
+	# prefix match and ssid is None for any SSID.
+	value = value.upper()
+	call, separator, ssid_text = value.rpartition('-')
+	if not separator:
+		call, ssid_text = value, '0'
+	if ssid_text == '*':
+		ssid = None
+	else:
+		ssid = int(ssid_text)
+		if ssid < 0 or ssid > 15:
+			raise ValueError(f'SSID out of range in {value}')
+	exact = True
+	if call.endswith('*'):
+		call = call[:-1]
+		exact = False
+	if len(call) > 6 or not call.isalnum() and not (call == '' and not exact):
+		raise ValueError(f'Invalid callsign {value}')
+	return bytes(character << 1 for character in call.encode('ascii')), exact, ssid
+
+def _AddressMatcher(value):
+	# Returns match(frame, offset) for the address field at offset.
+	call, exact, ssid = _ParseCallsign(value)
+	call_length = len(call)
+	def match(frame, offset):
+		if frame[offset:offset + call_length] != call:
+			return False
+		# The rest of an exact callsign must be padding.
+		if exact and frame[offset + call_length:offset + 6].strip(b'@\x00'):
+			return False
+		return ssid is None or (frame[offset + 6] >> 1) & 0xF == ssid
+	return match
+
+def _Negate(test, op):
+	if op == '!=':
+		return lambda frame, control_index: not test(frame, control_index)
+	if op not in ('=', '=='):
+		raise ValueError(f'Operator {op} only works on numbers')
+	return test
+
+def _HeaderTerm(test, op):
+	# test(frame, control_index) only runs on a frame with a valid header, and
+	# != negates the test alone, so a frame without a header fails either way.
+	test = _Negate(test, op)
+	def predicate(frame):
+		control_index = ax25.ControlIndex(frame)
+		return control_index >= 0 and test(frame, control_index)
+	return predicate
+
+def _FixedAddressTerm(offset, value, op):
+	match = _AddressMatcher(value)
+	return _HeaderTerm(lambda frame, control_index: match(frame, offset), op)
+
+def _CallTerm(value, op):
+	match = _AddressMatcher(value)
+	return _HeaderTerm(lambda frame, control_index: match(frame, DESTINATION_OFFSET) or match(frame, SOURCE_OFFSET), op)
+
+def _ViaTerm(value, op):
+	match = _AddressMatcher(value)
+	def test(frame, control_index):
+		for offset in range(15, control_index, ax25.ADDRESS_LENGTH):
+			if match(frame, offset):
+				return True
+		return False
+	return _HeaderTerm(test, op)
+
+def _TypeTerm(value, op):
+	value = value.upper()
+	if value in (ax25.FRAME_I, ax25.FRAME_S, ax25.FRAME_U):
+		table = ax25.CONTROL_TYPES
+	elif value in ax25.U_FRAME_NAMES.values():
+		table = ax25.CONTROL_NAMES
+	else:
+		raise ValueError(f'Unknown frame type {value}')
+	return _HeaderTerm(lambda frame, control_index: table[frame[control_index]] == value, op)
+
+def _NumberTerm(field, value, op):
+	compare = COMPARISONS[op]
+	number = int(value, 0)
+	if field == 'len':
+		return lambda frame: compare(len(frame), number)
+	if field == 'port':
+		return lambda frame: compare(frame[0] >> 4, number)
+	if field == 'control':
+		def predicate(frame):
+			control_index = ax25.ControlIndex(frame)
+			return control_index >= 0 and compare(frame[control_index], number)
+		return predicate
+	def predicate(frame):
+		control_index = ax25.ControlIndex(frame)
+		if control_index < 0 or not ax25.CONTROL_HAS_PID[frame[control_index]] or control_index + 1 >= len(frame):
+			return False
+		return compare(frame[control_index + 1], number)
+	return predicate
+
+def _Term(field, op, value):
+	field = field.lower()
+	if field == 'src':
+		return _FixedAddressTerm(SOURCE_OFFSET, value, op)
+	if field == 'dst':
+		return _FixedAddressTerm(DESTINATION_OFFSET, value, op)
+	if field == 'call':
+		return _CallTerm(value, op)
+	if field == 'via':
+		return _ViaTerm(value, op)
+	if field == 'type':
+		return _TypeTerm(value, op)
+	if field in ('pid', 'control', 'len', 'port'):
+		return _NumberTerm(field, value, op)
+	raise ValueError(f'Unknown filter field {field}')
+
+def _Tokenize(expression):
+	tokens = []
+	position = 0
+	expression = expression.rstrip()
+	while position < len(expression):
+		token = _TOKEN.match(expression, position)
+		if token is None:
+			raise ValueError(f'Unable to parse filter at {expression[position:]}')
+		position = token.end()
+		if token.group('paren'):
+			tokens.append(token.group('paren'))
+		elif token.group('term'):
+			tokens.append(_Term(token.group('field'), token.group('op'), token.group('value')))
+		else:
+			word = token.group('word').lower()
+			if word not in ('and', 'or', 'not'):
+				raise ValueError(f'Unexpected {token.group("word")} in filter')
+			tokens.append(word)
+	return tokens
+
+# Nested two term closures short circuit without the generator overhead of
+# any() and all().
+def _Both(first, second):
+	return lambda frame: first(frame) and second(frame)
+
+def _Either(first, second):
+	return lambda frame: first(frame) or second(frame)
+
+def _Fold(terms, combine):
+	predicate = terms[0]
+	for term in terms[1:]:
+		predicate = combine(predicate, term)
+	return predicate
+
+class _Parser:
+	# Recursive descent over the tokens, not binds tightest, then and, then or.
+
+	def __init__(self, tokens):
+		self.tokens = tokens
+		self.index = 0
+
+	def _Peek(self):
+		if self.index < len(self.tokens):
+			return self.tokens[self.index]
+		return None
+
+	def _Next(self):
+		token = self._Peek()
+		if token is None:
+			raise ValueError('Filter ends unexpectedly')
+		self.index += 1
+		return token
+
+	def parse(self):
+		predicate = self._Or()
+		if self._Peek() is not None:
+			raise ValueError('Expected and, or or the end of the filter')
+		return predicate
+
+	def _Or(self):
+		terms = [self._And()]
+		while self._Peek() == 'or':
+			self._Next()
+			terms.append(self._And())
+		return _Fold(terms, _Either)
+
+	def _And(self):
+		terms = [self._Not()]
+		while self._Peek() == 'and':
+			self._Next()
+			terms.append(self._Not())
+		return _Fold(terms, _Both)
+
+	def _Not(self):
+		token = self._Next()
+		if token == 'not':
+			term = self._Not()
+			return lambda frame: not term(frame)
+		if token == '(':
+			predicate = self._Or()
+			if self._Next() != ')':
+				raise ValueError('Missing ) in filter')
+			return predicate
+		if callable(token):
+			return token
+		raise ValueError(f'Unexpected {token} in filter')
+
+def CompileFilter(expression):
+	# Returns a predicate taking a KISS frame, with its type byte, and returning
+	# True when the frame matches. Raises ValueError for a malformed expression.
+	return _Parser(_Tokenize(expression)).parse()
+
+class FrameFilter:
+	# A compiled filter that counts the frames it matches and drops.
+
+	def __init__(self, expression):
+		self.expression = expression
+		self.predicate = CompileFilter(expression)
+		self.matched_count = 0
+		self.dropped_count = 0
+
+	def match(self, frame):
+		if self.predicate(frame):
+			self.matched_count += 1
+			return True
+		self.dropped_count += 1
+		return False
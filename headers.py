@@ -13,13 +13,16 @@
 # 7 Payload text is invalid
 # 8 Payload length is invalid
 # 9 Frame interval is invalid
+# 10 Invalid option
 
 import serial
 import sys
-import time
+import kiss
+import pacing
+import corpus
 import random
 import crc
-import string
+import ax25
 
 def GracefulExit(port, code):
 	try:
@@ -30,52 +33,12 @@ def GracefulExit(port, code):
 		#print('Closed port ', port.port)
 		sys.exit(code)
 
-def StringCallsignToArray(input_string, error_string, error_code):
-	output = [0x20, 0x20, 0x20, 0x20, 0x20, 0x20, 0]
-	callsign_length = 0
-	ssid_digits = 0
-	ssid = [0,0]
-	currently_reading = 'callsign'
-	input_string = input_string.upper()
-	input_string = bytes(input_string, 'UTF-8')
-	for character in input_string:
-		if currently_reading == 'callsign':
-			if character == bytes('-', 'UTF-8')[0]:
-				currently_reading = 'ssid'
-			else:
-				output[callsign_length] = int(character)
-				callsign_length += 1
-				if callsign_length == 6:
-					currently_reading = 'hyphen'
-				# print(output)
-		elif currently_reading == 'hyphen':
-			if character != bytes('-', 'UTF-8')[0]:
-				print(error_string)
-				sys.exit(error_code)
-			currently_reading = 'ssid'
-		elif currently_reading == 'ssid':
-			ssid[ssid_digits] = character - bytes('0', 'UTF-8')[0]
-			ssid_digits += 1
-			# print(ssid)
-	if ssid_digits == 1:
-		ssid = ssid[0]
-	elif ssid_digits == 2:
-		ssid = ssid[0] * 10 + ssid[1]
-	else:
-		ssid = 0
-	if ssid > 16:
-		ssid = 16
-	if ssid < 0:
-		ssid = 0
-	output[6] = ssid
-	return output
-
 if sys.version_info < (3, 0):
 	print("Python version should be 3.x, exiting")
 	sys.exit(1)
 
 if len(sys.argv) < 4:
-	print('Not enough arguments. Usage prototype below.\r\npython3 headers.py <serial device> <baud rate> <count> <interval>')
+	print('Not enough arguments. Usage prototype below.\r\npython3 headers.py <serial device> <baud rate> <count> <interval> <optional corpus=inline|prebuild|stream> <optional depth=frames>')
 	sys.exit(2)
 
 try:
@@ -96,42 +59,36 @@ except:
 	print('Invalid interval')
 	sys.exit(4)
 
-FESC = int(0xDB).to_bytes(1,'big')
-FEND = int(0xC0).to_bytes(1,'big')
-TFESC = int(0xDD).to_bytes(1,'big')
-TFEND = int(0xDC).to_bytes(1,'big')
-KISS_PORT = 0
-KISS_COMMAND = 0
-KISS_TYPE_ID = (KISS_PORT * 16) + KISS_COMMAND
-KISS_TYPE_ID = KISS_TYPE_ID.to_bytes(1,'big')
-
-
-for i in range(0, frame_count):
+# How frames are generated, see corpus.FrameSource.
+corpus_mode = 'inline'
+corpus_depth = 64
 
+for option in sys.argv[5:]:
+	try:
+		if option.startswith('corpus='):
+			corpus_mode = option[7:]
+			if corpus_mode not in corpus.CORPUS_MODES:
+				raise ValueError
+		elif option.startswith('depth='):
+			corpus_depth = int(option[6:])
+		else:
+			raise ValueError
+	except ValueError:
+		print(f'Invalid option {option}.')
+		GracefulExit(port, 10)
 
-	source_callsign = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-	dest_callsign = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-	source_callsign += '-'
-	dest_callsign += '-'
-	source_callsign.join(random.choices(string.digits,k=1))
-	dest_callsign.join(random.choices(string.digits,k=1))
+KISS_PORT = 0
+KISS_COMMAND = 0
 
-	source_callsign = StringCallsignToArray(source_callsign, 'Source Callsign or SSID is invalid.', 4)
 
-	dest_callsign = StringCallsignToArray(dest_callsign, 'Source Callsign or SSID is invalid.', 4)
+# Random destination and source addresses for every frame, generated in one
+# buffer. Destination SSIDs have the CRR bits set, source SSIDs the Address
+# Extension Bit and RR bits.
+address_pairs = ax25.RandomAddressPairs(frame_count)
 
+def BuildFrame(i):
 	# Assemble KISS frame:
-	kiss_frame = bytearray()
-	# Add destination callsign, shifted left one bit:
-	for j in range(6):
-		kiss_frame.extend((dest_callsign[j]<<1).to_bytes(1,'big'))
-	# Add destination SSID with CRR bits set
-	kiss_frame.extend((((dest_callsign[6] & 0xF)<<1) | 0xE0).to_bytes(1,'big'))
-	# Add source callsign, shifted left one bit:
-	for k in range(6):
-		kiss_frame.extend((source_callsign[k]<<1).to_bytes(1,'big'))
-	# Add source SSID with Address Extension Bit and RR bits:
-	kiss_frame.extend((((source_callsign[6] & 0xF) << 1) | 0x61).to_bytes(1,'big'))
+	kiss_frame = bytearray(address_pairs[i * ax25.ADDRESS_PAIR_LENGTH:(i + 1) * ax25.ADDRESS_PAIR_LENGTH])
 
 	# Add Control field for UI:
 	ui = random.randint(0,255)
@@ -153,23 +110,20 @@ for i in range(0, frame_count):
 			print(f'\n', end='')
 	sys.stdout.flush()
 
-	frame_index = 0
-	kiss_output_frame = bytearray()
-	while(frame_index < len(kiss_frame)):
-		kiss_byte = kiss_frame[frame_index]
-		if kiss_byte.to_bytes(1,'big') == FESC:
-			kiss_output_frame.extend(FESC)
-			kiss_output_frame.extend(TFESC)
-		elif kiss_byte.to_bytes(1, 'big') == FEND:
-			kiss_output_frame.extend(FESC)
-			kiss_output_frame.extend(TFEND)
-		else:
-			kiss_output_frame.extend(kiss_byte.to_bytes(1, 'big'))
-		frame_index += 1
-	kiss_output_frame = bytearray(FEND) + bytearray(KISS_TYPE_ID) + kiss_output_frame + bytearray(FEND)
-	# print(kiss_output_frame)
-	frame_time = len(kiss_output_frame) * 10 / int(sys.argv[2])
+	kiss_output_frame = kiss.EncodeKISSFrame(kiss_frame, KISS_PORT, KISS_COMMAND)
+	return kiss_output_frame
+
+pacer = pacing.DeadlinePacer()
+frame_source = corpus.FrameSource(BuildFrame, frame_count, corpus_mode, corpus_depth)
+
+# The transmit loop only paces and writes.
+for kiss_output_frame in frame_source:
+	pacer.wait()
 	port.write(kiss_output_frame)
-	time.sleep(interval)
+	pacer.advance(interval)
+report = pacer.report()
+pacer.wait()
 print('\nDone.')
+print(corpus.FormatGeneration(frame_source))
+print(pacing.FormatReport(report))
 GracefulExit(port, 0)
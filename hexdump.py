@@ -0,0 +1,62 @@
+# Console hex dump and text rendering for received frames.
+
+import time
+
+HEX_DIGITS = b'0123456789ABCDEF'
+# Byte value to the high and low characters of its "%2X" form, the high
+# character is a space below 0x10.
+HIGH_DIGIT = bytes(b' '[0] if value < 0x10 else HEX_DIGITS[value >> 4] for value in range(256))
+LOW_DIGIT = bytes(HEX_DIGITS[value & 0xF] for value in range(256))
+# Printable ASCII passes through, everything else shows as '.'.
+PRINTABLE = bytes(value if 0x20 <= value <= 0x7E else b'.'[0] for value in range(256))
+
+BYTES_PER_LINE = 16
+
+def HexColumn(data):
+	# Equivalent to ''.join('%2X ' % byte for byte in data), as bytes.
+	count = len(data)
+	output = bytearray(b' ') * (3 * count)
+	output[0::3] = data.translate(HIGH_DIGIT)
+	output[1::3] = data.translate(LOW_DIGIT)
+	return output
+
+def DumpLines(frame):
+	# Returns the dump of frame as one string, 16 bytes per line: the printable
+	# characters padded to 16 columns, ' | ', then the "%2X " byte values, each
+	# line ending in '\r\n'.
+	frame = bytes(frame)
+	count = len(frame)
+	if count == 0:
+		return ''
+	text = frame.translate(PRINTABLE)
+	text += b' ' * (-count % BYTES_PER_LINE)
+	hex_column = HexColumn(frame)
+	lines = []
+	for start in range(0, count, BYTES_PER_LINE):
+		lines.append(text[start:start + BYTES_PER_LINE])
+		lines.append(b' | ')
+		lines.append(hex_column[3 * start:3 * (start + BYTES_PER_LINE)])
+		lines.append(b'\r\n')
+	return b''.join(lines).decode('ascii')
+
+class TimestampCache:
+	# Formats nanosecond wall clock timestamps as 'YYYY-MM-DD HH:MM:SS.mmm' in
+	# local time. The date and time part is formatted once per second.
+
+	def __init__(self):
+		self.second = None
+		self.prefix = ''
+
+	def format(self, timestamp_ns):
+		second, nanoseconds = divmod(timestamp_ns, 1000000000)
+		if second != self.second:
+			self.second = second
+			self.prefix = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+		return f'{self.prefix}.{nanoseconds // 1000000:03d}'
+
+# Byte value to its text form, printable ASCII as itself, others as '<0x..>'.
+ESCAPED_TEXT = [chr(value) if 0x20 <= value <= 0x7E else f'<{hex(value)}>' for value in range(256)]
+
+def EscapeText(data):
+	# Payload as text with unprintable bytes shown as their hex value.
+	return ''.join([ESCAPED_TEXT[value] for value in data])
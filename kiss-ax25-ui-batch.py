@@ -13,12 +13,16 @@
 # 7 Payload text is invalid
 # 8 Payload length is invalid
 # 9 Frame interval is invalid
+# 10 Invalid option
 
 import serial
 import sys
-import time
-import random
+import kiss
+import pacing
+import corpus
+import payloads
 import crc
+import ax25
 
 def GracefulExit(port, code):
 	try:
@@ -29,52 +33,12 @@ def GracefulExit(port, code):
 		#print('Closed port ', port.port)
 		sys.exit(code)
 
-def StringCallsignToArray(input_string, error_string, error_code):
-	output = [0x20, 0x20, 0x20, 0x20, 0x20, 0x20, 0]
-	callsign_length = 0
-	ssid_digits = 0
-	ssid = [0,0]
-	currently_reading = 'callsign'
-	input_string = input_string.upper()
-	input_string = bytes(input_string, 'UTF-8')
-	for character in input_string:
-		if currently_reading == 'callsign':
-			if character == bytes('-', 'UTF-8')[0]:
-				currently_reading = 'ssid'
-			else:
-				output[callsign_length] = int(character)
-				callsign_length += 1
-				if callsign_length == 6:
-					currently_reading = 'hyphen'
-				# print(output)
-		elif currently_reading == 'hyphen':
-			if character != bytes('-', 'UTF-8')[0]:
-				print(error_string)
-				sys.exit(error_code)
-			currently_reading = 'ssid'
-		elif currently_reading == 'ssid':
-			ssid[ssid_digits] = character - bytes('0', 'UTF-8')[0]
-			ssid_digits += 1
-			# print(ssid)
-	if ssid_digits == 1:
-		ssid = ssid[0]
-	elif ssid_digits == 2:
-		ssid = ssid[0] * 10 + ssid[1]
-	else:
-		ssid = 0
-	if ssid > 16:
-		ssid = 16
-	if ssid < 0:
-		ssid = 0
-	output[6] = ssid
-	return output
-
 if sys.version_info < (3, 0):
 	print("Python version should be 3.x, exiting")
 	sys.exit(1)
 
 if len(sys.argv) < 9:
-	print('Not enough arguments. Usage prototype below.\r\npython3 kiss-ax25-ui-batch.py <serial device> <baud rate> <src call-ssid> <dest call-ssid> <frame count> <payload text> <payload length> <frame interval>')
+	print('Not enough arguments. Usage prototype below.\r\npython3 kiss-ax25-ui-batch.py <serial device> <baud rate> <src call-ssid> <dest call-ssid> <frame count> <payload text> <payload length> <frame interval> <optional rate=frames/s> <optional utilization=percent> <optional airbaud=bits/s> <optional corpus=inline|prebuild|stream> <optional depth=frames> <optional payload=printable|binary>')
 	sys.exit(2)
 
 try:
@@ -83,12 +47,17 @@ except:
 	print('Unable to open serial port.')
 	sys.exit(3)
 
-source_callsign = StringCallsignToArray(sys.argv[3], 'Source Callsign or SSID is invalid.', 4)
-
-dest_callsign = StringCallsignToArray(sys.argv[4], 'Destination Callsign or SSID is invalid.', 5)
+try:
+	source_address = ax25.EncodeAddress(sys.argv[3], ax25.SOURCE_FLAGS)
+except ValueError:
+	print('Source Callsign or SSID is invalid.')
+	GracefulExit(port, 4)
 
-#print(source_callsign)
-#print(dest_callsign)
+try:
+	dest_address = ax25.EncodeAddress(sys.argv[4], ax25.DESTINATION_FLAGS)
+except ValueError:
+	print('Destination Callsign or SSID is invalid.')
+	GracefulExit(port, 5)
 
 try:
 	frame_count = int(sys.argv[5])
@@ -114,60 +83,96 @@ except:
 	print('Frame interval is not a number.')
 	GracefulExit(port, 9)
 
-random.seed(123)
+# Pacing targets, either overrides the frame interval.
+target_rate = None
+target_utilization = None
+# On-air bit rate for airtime. When not given, airtime is the serial time of the
+# KISS frame at 10 bits per byte.
+air_baud = None
+# How frames are generated, see corpus.FrameSource.
+corpus_mode = 'inline'
+corpus_depth = 64
+# Padding characters, see payloads.PayloadGenerator.
+payload_kind = 'printable'
+
+for option in sys.argv[9:]:
+	try:
+		if option.startswith('rate='):
+			target_rate = float(option[5:])
+			if target_rate <= 0:
+				raise ValueError
+		elif option.startswith('utilization='):
+			target_utilization = float(option[12:])
+			if target_utilization <= 0 or target_utilization > 100:
+				raise ValueError
+		elif option.startswith('airbaud='):
+			air_baud = int(option[8:])
+			if air_baud <= 0:
+				raise ValueError
+		elif option.startswith('corpus='):
+			corpus_mode = option[7:]
+			if corpus_mode not in corpus.CORPUS_MODES:
+				raise ValueError
+		elif option.startswith('depth='):
+			corpus_depth = int(option[6:])
+		elif option.startswith('payload='):
+			payload_kind = option[8:]
+			if payload_kind not in payloads.PAYLOAD_KINDS:
+				raise ValueError
+		else:
+			raise ValueError
+	except ValueError:
+		print(f'Invalid option {option}.')
+		GracefulExit(port, 10)
+
+if target_rate is not None:
+	frame_interval = 1 / target_rate
+
+# Fixed seed, so every run pads with the same characters.
+payload_generator = payloads.PayloadGenerator(123, payload_kind)
 
-FESC = int(0xDB).to_bytes(1,'big')
-FEND = int(0xC0).to_bytes(1,'big')
-TFESC = int(0xDD).to_bytes(1,'big')
-TFEND = int(0xDC).to_bytes(1,'big')
 KISS_PORT = 0
 KISS_COMMAND = 0
-KISS_TYPE_ID = (KISS_PORT * 16) + KISS_COMMAND
-KISS_TYPE_ID = KISS_TYPE_ID.to_bytes(1,'big')
 
-for i in range(0, frame_count):
+# Assemble the AX.25 header, which is the same for every frame:
+header = bytearray()
+# Add destination address, SSID with CRR bits set:
+header.extend(dest_address)
+# Add source address, SSID with Address Extension Bit and RR bits:
+header.extend(source_address)
 
-	# Assemble KISS frame:
-	kiss_frame = bytearray()
-	# Add destination callsign, shifted left one bit:
-	for j in range(6):
-		kiss_frame.extend((dest_callsign[j]<<1).to_bytes(1,'big'))
-	# Add destination SSID with CRR bits set
-	kiss_frame.extend((((dest_callsign[6] & 0xF)<<1) | 0xE0).to_bytes(1,'big'))
-	# Add source callsign, shifted left one bit:
-	for k in range(6):
-		kiss_frame.extend((source_callsign[k]<<1).to_bytes(1,'big'))
-	# Add source SSID with Address Extension Bit and RR bits:
-	kiss_frame.extend((((source_callsign[6] & 0xF) << 1) | 0x61).to_bytes(1,'big'))
-
-	# Add Control field for UI:
-	kiss_frame.extend((0x03).to_bytes(1,'big'))
-	# Add PID for No Layer 3:
-	kiss_frame.extend((0xF0).to_bytes(1,'big'))
-
-	# save the length of the kiss frame for payload length computations later
-	payload_length = len(kiss_frame)
+# Add Control field for UI:
+header.extend((0x03).to_bytes(1,'big'))
+# Add PID for No Layer 3:
+header.extend((0xF0).to_bytes(1,'big'))
+
+# save the length of the header for payload length computations later
+header_length = len(header)
+if header_length < target_payload_length:
+	header.extend(bytearray(payload_text, 'UTF-8'))
 
+# Hash the fixed part of the frame once, each frame continues from a copy.
+header_crc = crc.CRC16(header)
+
+def BuildFrame(i):
+	# Assemble KISS frame:
+	kiss_frame = bytearray(header)
 
 	#kiss_frame.extend(payload)
-	if payload_length < target_payload_length:
-		payload = bytearray(payload_text, 'UTF-8')
-		kiss_frame.extend(payload)
+	if header_length < target_payload_length:
 		kiss_frame.extend(bytearray(str(i + 1), 'UTF-8'))
 		kiss_frame.extend(bytearray(" ", 'UTF-8'))
 
-	payload_length = len(kiss_frame) - payload_length
+	payload_length = len(kiss_frame) - header_length
 	#print(payload_length)
 
 	# Pad payload to specified length:
 	if payload_length < target_payload_length:
-		payload = bytearray()
-		for j in range(0, target_payload_length - payload_length):
-			rand = random.randint(32,126)
-			payload.extend(bytearray(rand.to_bytes(1,'big')))
-		kiss_frame.extend(payload)
+		kiss_frame.extend(payload_generator.take(target_payload_length - payload_length))
 
-	print(f'\nFrame {i+1} CRC value: {crc.CalcCRC16(kiss_frame)}')
+	frame_crc = header_crc.copy()
+	frame_crc.update(kiss_frame[len(header):])
+	print(f'\nFrame {i+1} CRC value: {hex(frame_crc.intdigest())}')
 	character_counter = 0
 	for character in kiss_frame:
 		print(hex(character), end=' ')
@@ -177,23 +182,36 @@ for i in range(0, frame_count):
 			print(f'\n', end='')
 	sys.stdout.flush()
 
-	frame_index = 0
-	kiss_output_frame = bytearray()
-	while(frame_index < len(kiss_frame)):
-		kiss_byte = kiss_frame[frame_index]
-		if kiss_byte.to_bytes(1,'big') == FESC:
-			kiss_output_frame.extend(FESC)
-			kiss_output_frame.extend(TFESC)
-		elif kiss_byte.to_bytes(1, 'big') == FEND:
-			kiss_output_frame.extend(FESC)
-			kiss_output_frame.extend(TFEND)
-		else:
-			kiss_output_frame.extend(kiss_byte.to_bytes(1, 'big'))
-		frame_index += 1
-	kiss_output_frame = bytearray(FEND) + bytearray(KISS_TYPE_ID) + kiss_output_frame + bytearray(FEND)
+	kiss_output_frame = kiss.EncodeKISSFrame(kiss_frame, KISS_PORT, KISS_COMMAND)
 	# print(kiss_output_frame)
-	frame_time = len(kiss_output_frame) * 10 / int(sys.argv[2])
+	if air_baud is None:
+		frame_time = len(kiss_output_frame) * 10 / int(sys.argv[2])
+	else:
+		frame_time = len(kiss_frame) * 8 / air_baud
+	return kiss_output_frame, frame_time
+
+pacer = pacing.DeadlinePacer()
+airtime_total = 0.0
+frame_source = corpus.FrameSource(BuildFrame, frame_count, corpus_mode, corpus_depth)
+
+# The transmit loop only paces and writes.
+for kiss_output_frame, frame_time in frame_source:
+	airtime_total += frame_time
+	# Send at the deadline, then set the next one from this deadline, not from
+	# now, so generation, printing and write time don't stretch the period.
+	pacer.wait()
 	port.write(kiss_output_frame)
-	time.sleep(frame_interval)
+	if target_utilization is not None:
+		pacer.advance(frame_time * 100 / target_utilization)
+	else:
+		pacer.advance(frame_interval)
+report = pacer.report()
+# Hold the port open for the last frame's interval, as before.
+pacer.wait()
 print('\nDone.')
+print(corpus.FormatGeneration(frame_source))
+print(pacing.FormatReport(report))
+run_time = pacer.last_event_time - pacer.first_event_time
+if run_time > 0:
+	print(f'Channel utilization {airtime_total * 100 / run_time:.1f}%')
 GracefulExit(port, 0)
@@ -12,6 +12,8 @@
 
 import serial
 import sys
+import kiss
+import ax25
 import time
 
 def GracefulExit(port, code):
@@ -23,46 +25,6 @@ def GracefulExit(port, code):
 		#print('Closed port ', port.port)
 		sys.exit(code)
 
-def StringCallsignToArray(input_string, error_string, error_code):
-	output = [32, 32, 32, 32, 32, 32, 0]
-	callsign_length = 0
-	ssid_digits = 0
-	ssid = [0,0]
-	currently_reading = 'callsign'
-	input_string = input_string.upper()
-	input_string = bytes(input_string, 'UTF-8')
-	for character in input_string:
-		if currently_reading == 'callsign':
-			if character == bytes('-', 'UTF-8')[0]:
-				currently_reading = 'ssid'
-			else:
-				output[callsign_length] = int(character)
-				callsign_length += 1
-				if callsign_length == 6:
-					currently_reading = 'hyphen'
-				# print(output)
-		elif currently_reading == 'hyphen':
-			if character != bytes('-', 'UTF-8')[0]:
-				print(error_string)
-				sys.exit(error_code)
-			currently_reading = 'ssid'
-		elif currently_reading == 'ssid':
-			ssid[ssid_digits] = character - bytes('0', 'UTF-8')[0]
-			ssid_digits += 1
-			# print(ssid)
-	if ssid_digits == 1:
-		ssid = ssid[0]
-	elif ssid_digits == 2:
-		ssid = ssid[0] * 10 + ssid[1]
-	else:
-		ssid = 0
-	if ssid > 16:
-		ssid = 16
-	if ssid < 0:
-		ssid = 0
-	output[6] = ssid
-	return output
-
 if sys.version_info < (3, 0):
 	print("Python version should be 3.x, exiting")
 	sys.exit(1)
@@ -77,37 +39,31 @@ except:
 	print('Unable to open serial port.')
 	sys.exit(3)
 
-source_callsign = StringCallsignToArray(sys.argv[3], 'Source Callsign or SSID is invalid.', 4)
+try:
+	source_address = ax25.EncodeAddress(sys.argv[3], ax25.SSID_LAST)
+except ValueError:
+	print('Source Callsign or SSID is invalid.')
+	GracefulExit(port, 4)
 
 if len(sys.argv) > 4:
 	dest_callsign = sys.argv[4]
 else:
 	dest_callsign = 'IDENT-0'
-dest_callsign = StringCallsignToArray(dest_callsign, 'Destination Callsign or SSID is invalid.', 5)
-#print(source_callsign)
-#print(dest_callsign)
+try:
+	dest_address = ax25.EncodeAddress(dest_callsign)
+except ValueError:
+	print('Destination Callsign or SSID is invalid.')
+	GracefulExit(port, 5)
 
-FESC = int(0xDB).to_bytes(1,'big')
-FEND = int(0xC0).to_bytes(1,'big')
-TFESC = int(0xDD).to_bytes(1,'big')
-TFEND = int(0xDC).to_bytes(1,'big')
 KISS_PORT = 0
 KISS_COMMAND = 0
-KISS_TYPE_ID = (KISS_PORT * 16) + KISS_COMMAND
-KISS_TYPE_ID = KISS_TYPE_ID.to_bytes(1,'big')
 
 # Assemble KISS frame:
 kiss_frame = bytearray()
-# Add destination callsign, shifted left one bit:
-for i in range(6):
-	kiss_frame.extend((dest_callsign[i]<<1).to_bytes(1,'big'))
-# Add destination SSID:
-kiss_frame.extend(((dest_callsign[6] & 0xF)<<1).to_bytes(1,'big'))
-# Add source callsign, shifted left one bit:
-for i in range(6):
-	kiss_frame.extend((source_callsign[i]<<1).to_bytes(1,'big'))
-# Add source SSID with Address Extension Bit:
-kiss_frame.extend((((source_callsign[6] & 0xF) << 1) | 1).to_bytes(1,'big'))
+# Add destination address:
+kiss_frame.extend(dest_address)
+# Add source address, its SSID has the Address Extension Bit:
+kiss_frame.extend(source_address)
 
 # Add Control field for UI:
 kiss_frame.extend((0x03).to_bytes(1,'big'))
@@ -121,20 +77,7 @@ except:
 kiss_frame.extend(payload)
 #print(kiss_frame)
 
-frame_index = 0
-kiss_output_frame = bytearray()
-while(frame_index < len(kiss_frame)):
-	kiss_byte = kiss_frame[frame_index]
-	if kiss_byte.to_bytes(1,'big') == FESC:
-		kiss_output_frame.extend(FESC)
-		kiss_output_frame.extend(TFESC)
-	elif kiss_byte.to_bytes(1, 'big') == FEND:
-		kiss_output_frame.extend(FESC)
-		kiss_output_frame.extend(TFEND)
-	else:
-		kiss_output_frame.extend(kiss_byte.to_bytes(1, 'big'))
-	frame_index += 1
-kiss_output_frame = bytearray(FEND) + bytearray(KISS_TYPE_ID) + kiss_output_frame + bytearray(FEND)
+kiss_output_frame = kiss.EncodeKISSFrame(kiss_frame, KISS_PORT, KISS_COMMAND)
 # print(kiss_output_frame)
 frame_time = len(kiss_output_frame) * 10 / int(sys.argv[2])
 port.write(kiss_output_frame)
@@ -1,262 +1,295 @@
 # kiss-listen
 # Python3
-# Monitors KISS frames from specified serial port.
+# Monitors KISS frames from one or more specified serial ports.
 # Nino Carrillo
 # 30 Jan 2022
 # Exit codes
 # 1 Wrong python version
 # 2 Not enough command line arguments
 # 3 Unable to open serial port
+# 4 Invalid option
+# 5 Unable to open capture file
 
 import serial
 import sys
-import datetime
-import crc
+import time
+import queue
+import kiss
+import pcap
+import hexdump
+import ax25
+import records
+import filters
+import dedupe
 
 def print_ax25_header(frame, delimiter):
-	count = len(frame)
-	index = 0
-	if (count > 15):
-		valid_header = 1
-		address_extension_bit = 0
-		index = 1
-		subfield_character_index = 0
-		subfield_index = 0
-		# Print address information
-		while address_extension_bit == 0:
-			working_character = int(frame[index])
-			if (working_character & 0b1) == 1:
-				address_extension_bit = 1
-			working_character = working_character >> 1
-			subfield_character_index = subfield_character_index + 1
-			if (subfield_character_index == 1):
-				if (subfield_index == 0):
-					print("To:", end='')
-				elif (subfield_index == 1):
-					print(delimiter, end='')
-					print("From:", end='')
-				else:
-					print(delimiter, end='')
-					print("Via:", end='')
-			if subfield_character_index < 7:
-				# This is a callsign character
-				if (working_character != 0) and (working_character != 0x20):
-					print(chr(working_character), end='')
-			elif subfield_character_index == 7:
-				# This is the SSID characters
-				# Get bits
-				print('-', end='')
-				print(working_character & 0b1111, end='')
-				if (working_character & 0b10000000):
-					# C or H bit is set
-					print('*', end=' ')
-				# This field is complete
-				subfield_character_index = 0
-				subfield_index = subfield_index + 1
-			index = index + 1
-			if index > count:
-				address_extension_bit = 1
-		# Control and PID fields
-		working_character = frame[index]
-		print(delimiter, end='')
-		print("Control: ", end='')
-		print(f'{hex(working_character)} ', end='')
-		poll_final_bit = (working_character & 0x10) >> 4
-		# determine what type of frame this is
-		if (working_character & 1) == 1:
-			# either a Supervisory or Unnumbered frame
-			frame_type = working_character & 3
-		else:
-			# Information frame
-			frame_type = 0
-			ax25_ns = (working_character >> 1) & 7
-			ax25_nr = (working_character >> 5) & 7
+	# Prints the decoded header and returns the index of the payload, or 0 when
+	# the frame has no valid AX.25 header.
+	header = ax25.DecodeAX25Header(frame)
+	if header is None:
+		return 0
+	print(ax25.FormatAX25Header(header, delimiter) + ' ')
+	return header.payload_offset
 
-		if frame_type == 1:
-			# Supervisory frame
-			ax25_nr = (working_character >> 5) & 7
+def print_frame(frame, time, crc_val, count, port_name=None, repeat=0):
+	# Render the header and dump as one string and write it once.
+	if port_name is not None:
+		port_label = f' port: {port_name}'
+	else:
+		port_label = ''
+	if repeat > 0:
+		repeat_label = f' repeat: {repeat}'
+	else:
+		repeat_label = ''
+	sys.stdout.write(f'\r\n-- {time} crc: {crc_val}{port_label} number: {count}{repeat_label} byte count:  {len(frame)}\r\n' + hexdump.DumpLines(frame))
+	sys.stdout.flush()
 
-		if frame_type == 3:
-			# Unnumbered frame, determine what type
-			ax25_u_control_field_type = working_character & 0xEF
-		else:
-			ax25_u_control_field_type = 0
+if sys.version_info < (3, 0):
+	print("Python version should be 3.x, exiting")
+	sys.exit(1)
 
-		if (ax25_u_control_field_type == 0x6F):
-			print("SABME", end='')
-		elif (ax25_u_control_field_type == 0x2F):
-			print("SABM", end='')
-		elif (ax25_u_control_field_type == 0x43):
-			print("DISC", end='')
-		elif (ax25_u_control_field_type == 0x0F):
-			print("DM", end='')
-		elif (ax25_u_control_field_type == 0x63):
-			print("UA", end='')
-		elif (ax25_u_control_field_type == 0x87):
-			print("FRMR", end='')
-		elif (ax25_u_control_field_type == 0x03):
-			print("UI", end='')
-		elif (ax25_u_control_field_type == 0xAF):
-			print("XID", end='')
-		elif (ax25_u_control_field_type == 0xE3):
-			print("TEST", end='')
+def GracefulExit(ports, code):
+	for port in ports:
+		try:
+			port.close()
+		except:
+			pass
+	sys.exit(code)
 
-		if (frame_type == 0) or (ax25_u_control_field_type == 3):
-			# This is an Information frame, or an Unnumbered Information frame, so
-			# there is a PID byte.
-			index = index + 1
-			working_character = frame[index]
-			print(delimiter, end='')
-			print("PID: ", end='')
-			print(f'{hex(working_character)} ', end='')
-			if (working_character == 1):
-				print("ISO 8208", end='')
-			if (working_character == 6):
-				print("Compressed TCP/IP", end='')
-			if (working_character == 7):
-				print("Uncompressed TCP/IP", end='')
-			if (working_character == 8):
-				print("Segmentation Fragment", end='')
-			if (working_character == 0xC3):
-				print("TEXNET", end='')
-			if (working_character == 0xC4):
-				print("Link Quality Protocol", end='')
-			if (working_character == 0xCA):
-				print("Appletalk", end='')
-			if (working_character == 0xCC):
-				print("ARPA Internet Protocol", end='')
-			if (working_character == 0xCD):
-				print("ARPA Address Resolution", end='')
-			if (working_character == 0xCF):
-				print("TheNET (NET/ROM)", end='')
-			if (working_character == 0xF0):
-				print("No Layer 3", end='')
-			if (working_character == 0xFF):
-				print("Escape", end='')
+def CloseCaptures(captures):
+	for capture in captures.values():
+		try:
+			capture.close()
+		except:
+			pass
 
-		index = index + 1
+def CaptureFileName(file_name, index):
+	# With several ports each gets its own capture file, numbered by port.
+	stem, dot, extension = file_name.rpartition('.')
+	if not dot:
+		return f'{file_name}-{index}'
+	return f'{stem}-{index}.{extension}'
 
-		# return the index of the start of payload data
-		print(" ")
-	return index
+def ParsePortSpec(spec):
+	# Returns (device, baud) for a device:baud argument, or None.
+	device, separator, baud = spec.rpartition(':')
+	if separator and device and baud.isdigit():
+		return (device, baud)
+	return None
 
-def print_frame(frame, time, crc_val, count):
-	print("\r\n-- ", end='')
-	print(time, end=' ')
-	frame_len = len(frame)
-	print(f'crc: {crc_val}', end='')
-	print(" number: %d" % count, end=' ')
-	print("byte count: ", frame_len, end='\r\n')
-	frame_lines = (frame_len // 16)
-	if (frame_len % 16) > 0:
-		frame_lines += 1
-	last_line_len = frame_len - (frame_lines * 16)
-	frame_index = 0
-	for line in range(0, frame_lines):
-		for i in range(0, 16):
-			if frame_index < frame_len:
-				if frame[frame_index] < 0x20:
-					print('.', end='')
-				elif frame[frame_index] > 0x7E:
-					print('.', end='')
-				else:
-					print(chr(frame[frame_index]), end='')
-				frame_index += 1
-			else:
-				print(' ', end='')
-		print(' | ', end='')
-		frame_index = line * 16
-		for i in range(0, 16):
-			if frame_index < frame_len:
-				print("%2X" % frame[frame_index], end=' ')
-				frame_index += 1
-		print('\r\n', end='', flush=True)
+usage = 'Usage: python3 kiss-listen.py <serial device> <baud rate> or python3 kiss-listen.py <device:baud> [<device:baud> ...]'
 
-if sys.version_info < (3, 0):
-	print("Python version should be 3.x, exiting")
-	sys.exit(1)
+dump_hex = True
+small_screen = False
+status_output = sys.stdout
+decode = True
+# Machine readable output instead of the console dump, see records.py.
+output_format = None
+payload_format = 'hex'
+frame_filter = None
+# Duplicate suppression, off unless a window is given.
+dedupe_window = None
+dedupe_size = 4096
+tag_repeats = False
+capture_file = None
+rotate_bytes = 0
+rotate_seconds = 0
 
-def GracefulExit(port, code):
-	try:
-		port.close()
-	except:
-		pass
-	finally:
-		sys.exit(code)
+positional = []
+args = sys.argv[1:]
+while len(args) > 0:
+	arg = args.pop(0)
+	if arg == "--format" and len(args) > 0:
+		# Also accepted in the same form as the other options.
+		arg = "format=" + args.pop(0)
+	elif arg.startswith("--format="):
+		arg = arg[2:]
+	if arg == "nohex":
+		dump_hex = False
+	elif arg == "smallscreen":
+		small_screen = True
+	elif arg == "nodecode":
+		decode = False
+	elif arg == "tagrepeats":
+		tag_repeats = True
+	elif arg.startswith("capture=") or arg.startswith("rotatesize=") or arg.startswith("rotatetime=") or arg.startswith("format=") or arg.startswith("payload=") or arg.startswith("filter=") or arg.startswith("dedupe=") or arg.startswith("dedupesize="):
+		name, value = arg.split('=', 1)
+		try:
+			if name == 'filter':
+				frame_filter = filters.FrameFilter(value)
+			elif name == 'dedupe':
+				dedupe_window = float(value)
+				if dedupe_window <= 0:
+					raise ValueError
+			elif name == 'dedupesize':
+				dedupe_size = int(value)
+				if dedupe_size <= 0:
+					raise ValueError
+			elif name == 'format':
+				if value not in records.OUTPUT_FORMATS:
+					raise ValueError
+				output_format = value
+			elif name == 'payload':
+				if value not in records.PAYLOAD_FORMATS:
+					raise ValueError
+				payload_format = value
+			elif name == 'capture':
+				if len(value) == 0:
+					raise ValueError
+				capture_file = value
+			elif name == 'rotatesize':
+				# Megabytes
+				rotate_bytes = int(float(value) * 1000000)
+				if rotate_bytes <= 0:
+					raise ValueError
+			elif name == 'rotatetime':
+				rotate_seconds = float(value)
+				if rotate_seconds <= 0:
+					raise ValueError
+		except ValueError:
+			print(f'Invalid option {arg}.')
+			sys.exit(4)
+	else:
+		positional.append(arg)
 
-if len(sys.argv) < 3:
-	print('Not enough arguments. Usage: python3 kiss-listen.py <serial device> <baud rate>')
-	sys.exit(2)
+if output_format is not None:
+	status_output = sys.stderr
 
-try:
-	port = serial.Serial(sys.argv[1], baudrate=sys.argv[2], bytesize=8, parity='N', stopbits=1, xonxoff=0, rtscts=0, timeout=3)
-except:
-	print('Unable to open serial port.')
-	sys.exit(3)
+port_specs = []
+arg_index = 0
+while arg_index < len(positional):
+	spec = ParsePortSpec(positional[arg_index])
+	if spec is not None:
+		arg_index += 1
+	elif arg_index + 1 < len(positional) and positional[arg_index + 1].isdigit():
+		spec = (positional[arg_index], positional[arg_index + 1])
+		arg_index += 2
+	else:
+		print(f'Invalid port specification {positional[arg_index]}. {usage}')
+		sys.exit(2)
+	port_specs.append(spec)
 
-print('Opened port', sys.argv[1])
+if len(port_specs) < 1:
+	print(f'Not enough arguments. {usage}')
+	sys.exit(2)
 
-dump_hex = True
-small_screen = False
+ports = []
+for device, baud in port_specs:
+	try:
+		ports.append(serial.Serial(device, baudrate=baud, bytesize=8, parity='N', stopbits=1, xonxoff=0, rtscts=0, timeout=3))
+	except:
+		print(f'Unable to open serial port {device}.')
+		GracefulExit(ports, 3)
+	print('Opened port', device, file=status_output)
+
+# One reader thread per port feeds a single queue, which is drained here in
+# time order. Threads rather than select() so Windows COM ports work too. The
+# readers hash each frame as it is deframed, so the FCS comes with the frame.
+frame_queue = queue.Queue()
+for port in ports:
+	kiss.KISSReader(port, frame_queue, port.port, with_crc=True).start()
 
-arg_count = len(sys.argv) - 3
+# Convert reader timestamps to wall clock time for display.
+wall_clock_offset = time.time_ns() - time.perf_counter_ns()
+timestamp_cache = hexdump.TimestampCache()
+multi_port = len(ports) > 1
 
-if arg_count > 0:
-	for arg_index in range(arg_count):
-		if sys.argv[arg_index + 3] == "nohex":
-			dump_hex = False
-		elif sys.argv[arg_index + 3] == "smallscreen":
-			small_screen = True
+# Frames are written to the capture file with their KISS type byte, as
+# LINKTYPE_AX25_KISS expects.
+captures = {}
+if capture_file is not None:
+	for index, port in enumerate(ports):
+		file_name = capture_file
+		if multi_port:
+			file_name = CaptureFileName(capture_file, index)
+		try:
+			captures[port.port] = pcap.PcapWriter(file_name, rotate_bytes=rotate_bytes, rotate_seconds=rotate_seconds)
+		except:
+			print(f'Unable to open capture file {file_name}.')
+			CloseCaptures(captures)
+			GracefulExit(ports, 5)
+		print(f'Capturing {port.port} to {file_name}', file=status_output)
 
-kiss_state = "non-escaped"
-kiss_frame = []
-FESC = 0xDB
-FEND = 0xC0
-TFESC = 0xDD
-TFEND = 0xDC
+duplicate_index = None
+if dedupe_window is not None:
+	duplicate_index = dedupe.DuplicateIndex(dedupe_window, dedupe_size)
 
-frame_count = 0
+# Records go to stdout, status messages move to stderr to keep it clean.
+record_writer = None
+if output_format is not None:
+	record_writer = records.RecordWriter(sys.stdout, output_format)
 
-while 1:
-	input_data = port.read(1)
-	if input_data:
-#		print(input_data)
-		if kiss_state == "non-escaped":
-			if ord(input_data) == FESC:
-				kiss_state = "escaped"
-			elif ord(input_data) == FEND:
-				if len(kiss_frame) > 0:
-					frame_count += 1
-					t = datetime.datetime.now()
-					t = t.strftime('%Y-%m-%d %H:%M:%S.%f')
-					#kiss_frame_time = time.strftime("%H:%M:%S", t)
-					if dump_hex == True:
-						print_frame(kiss_frame, t[:-3], crc.CalcCRC16(kiss_frame[1:]), frame_count)
-					else:
-						print(f"******* {t[:-3]} *******")
-					if small_screen == True:
-						header_length = print_ax25_header(kiss_frame, "\n")
-					else:
-						header_length = print_ax25_header(kiss_frame, ", ")
+frame_count = {}
+for port in ports:
+	frame_count[port.port] = 0
+open_count = len(ports)
 
-					kiss_frame_string = ""
-					for byte in kiss_frame[header_length:]:
-						if (byte < 0x7F) and (byte > 0x1F):
-							kiss_frame_string += chr(int(byte))
-						else:
-							kiss_frame_string += f'<{hex(int(byte))}>'
-					print(kiss_frame_string)
-					kiss_frame = []
-				else:
-					kiss_frame = []
+try:
+	while open_count > 0:
+		for capture in captures.values():
+			capture.poll()
+		if record_writer is not None:
+			record_writer.poll()
+		try:
+			timestamp, port_name, kiss_frame, frame_fcs = frame_queue.get(timeout=0.5)
+		except queue.Empty:
+			continue
+		if kiss_frame is None:
+			print(f'Lost port {port_name}', file=status_output)
+			open_count -= 1
+			continue
+		frame_count[port_name] += 1
+		# Frames the filter drops are counted and skipped before any other work.
+		if frame_filter is not None and not frame_filter.match(kiss_frame):
+			continue
+		if captures:
+			captures[port_name].write(kiss_frame, timestamp + wall_clock_offset)
+		if decode == False:
+			continue
+		# Copies of a frame heard again through digipeaters are dropped, or shown
+		# with their repeat count when tagging.
+		repeat = 0
+		if duplicate_index is not None:
+			repeat = duplicate_index.check(kiss_frame, timestamp / 1e9)
+			if repeat > 0 and not tag_repeats:
+				continue
+		t = timestamp_cache.format(timestamp + wall_clock_offset)
+		if record_writer is not None:
+			record_writer.write(records.FrameRecord(kiss_frame, t, timestamp + wall_clock_offset, port_name, frame_count[port_name], hex(frame_fcs), payload_format, repeat))
+			continue
+		if multi_port:
+			port_label = port_name
+		else:
+			port_label = None
+		#kiss_frame_time = time.strftime("%H:%M:%S", t)
+		if dump_hex == True:
+			print_frame(kiss_frame, t, hex(frame_fcs), frame_count[port_name], port_label, repeat)
+		elif repeat > 0:
+			if multi_port:
+				print(f"******* {t} {port_name} repeat {repeat} *******")
 			else:
-				kiss_frame.append(ord(input_data))
-		elif kiss_state == "escaped":
-			if ord(input_data) == TFESC:
-				kiss_frame.append(FESC)
-				kiss_state = "non-escaped"
-			elif ord(input_data) == TFEND:
-				kiss_frame.append(FEND)
-				kiss_state = "non-escaped"
+				print(f"******* {t} repeat {repeat} *******")
+		elif multi_port:
+			print(f"******* {t} {port_name} *******")
+		else:
+			print(f"******* {t} *******")
+		if small_screen == True:
+			header_length = print_ax25_header(kiss_frame, "\n")
+		else:
+			header_length = print_ax25_header(kiss_frame, ", ")
+
+		print(hexdump.EscapeText(kiss_frame[header_length:]))
+except KeyboardInterrupt:
+	pass
+
+if record_writer is not None:
+	record_writer.flush()
 
-GracefulExit(port, 0)
+CloseCaptures(captures)
+if frame_filter is not None:
+	print(f'Filter matched {frame_filter.matched_count} frames, dropped {frame_filter.dropped_count}', file=status_output)
+if duplicate_index is not None:
+	print(f'Duplicates {duplicate_index.duplicate_count} of {duplicate_index.unique_count + duplicate_index.duplicate_count} frames', file=status_output)
+for port_name, capture in captures.items():
+	print(f'Captured {capture.frame_count} frames from {port_name}', file=status_output)
+GracefulExit(ports, 0)
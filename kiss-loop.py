@@ -11,13 +11,22 @@
 # 5 Invalid frame count
 # 6 Invalid payload length
 # 7 Invalid inverval time
+# 8 Invalid option
+# 9 Unable to write statistics file
 
 import serial
 import sys
+import kiss
+import queue
+import json
+import stats
 from timeit import default_timer as timer
 import random
-import string
+import payloads
 import crc
+import hexdump
+import ax25
+import pacing
 
 def GracefulExit2(porta, portb, code):
 	try:
@@ -30,213 +39,134 @@ def GracefulExit2(porta, portb, code):
 		pass	
 	sys.exit(code)
 	
-def GenerateRandomCallsign():
-	this = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-	this += '-'
-	this += ''.join(random.choices(string.digits, k=1))
-	return this
-	
+def ParseSequence(frame, offset):
+	# Returns the frame number embedded at the start of the payload, or None.
+	end = frame.find(b' ', offset)
+	if end < 0:
+		return None
+	try:
+		return int(frame[offset:end])
+	except ValueError:
+		return None
+
 def print_ax25_header(frame):
-	count = len(frame)
-	index = 0
-	if (count > 15):
-		valid_header = 1
-		address_extension_bit = 0
-		index = 1
-		subfield_character_index = 0
-		subfield_index = 0
-		print("- AX.25 Decode:")
-		# Print address information
-		while address_extension_bit == 0:
-			working_character = int(frame[index])
-			if (working_character & 0b1) == 1:
-				address_extension_bit = 1
-			working_character = working_character >> 1
-			subfield_character_index = subfield_character_index + 1
-			if (subfield_character_index == 1):
-				if (subfield_index == 0):
-					print("To:", end='')
-				elif (subfield_index == 1):
-					print(", From:", end='')
-				else:
-					print(", Via:", end='')
-			if subfield_character_index < 7:
-				# This is a callsign character
-				if (working_character != 0) and (working_character != 0x20):
-					print(chr(working_character), end='')
-			elif subfield_character_index == 7:
-				# This is the SSID characters
-				# Get bits
-				print('-', end='')
-				print(working_character & 0b1111, end='')
-				if (working_character & 0b10000000):
-					# C or H bit is set
-					print('*', end=' ')
-				# This field is complete
-				subfield_character_index = 0
-				subfield_index = subfield_index + 1
-			index = index + 1
-			if index > count:
-				address_extension_bit = 1
-		# Control and PID fields
-		working_character = frame[index]
-		print(", Control: ", end='')
-		print(f'{hex(working_character)} ', end='')
-		poll_final_bit = (working_character & 0x10) >> 4
-		# determine what type of frame this is
-		if (working_character & 1) == 1:
-			# either a Supervisory or Unnumbered frame
-			frame_type = working_character & 3
-		else:
-			# Information frame
-			frame_type = 0
-			ax25_ns = (working_character >> 1) & 7
-			ax25_nr = (working_character >> 5) & 7
-
-		if frame_type == 1:
-			# Supervisory frame
-			ax25_nr = (working_character >> 5) & 7
-
-		if frame_type == 3:
-			# Unnumbered frame, determine what type
-			ax25_u_control_field_type = working_character & 0xEF
-		else:
-			ax25_u_control_field_type = 0
-
-		if (ax25_u_control_field_type == 0x6F):
-			print("SABME", end='')
-		elif (ax25_u_control_field_type == 0x2F):
-			print("SABM", end='')
-		elif (ax25_u_control_field_type == 0x43):
-			print("DISC", end='')
-		elif (ax25_u_control_field_type == 0x0F):
-			print("DM", end='')
-		elif (ax25_u_control_field_type == 0x63):
-			print("UA", end='')
-		elif (ax25_u_control_field_type == 0x87):
-			print("FRMR", end='')
-		elif (ax25_u_control_field_type == 0x03):
-			print("UI", end='')
-		elif (ax25_u_control_field_type == 0xAF):
-			print("XID", end='')
-		elif (ax25_u_control_field_type == 0xE3):
-			print("TEST", end='')
-
-		if (frame_type == 0) or (ax25_u_control_field_type == 3):
-			# This is an Information frame, or an Unnumbered Information frame, so
-			# there is a PID byte.
-			index = index + 1
-			working_character = frame[index]
-			print(", PID: ", end='')
-			print(f'{hex(working_character)} ', end='')
-			if (working_character == 1):
-				print("ISO 8208", end='')
-			if (working_character == 6):
-				print("Compressed TCP/IP", end='')
-			if (working_character == 7):
-				print("Uncompressed TCP/IP", end='')
-			if (working_character == 8):
-				print("Segmentation Fragment", end='')
-			if (working_character == 0xC3):
-				print("TEXNET", end='')
-			if (working_character == 0xC4):
-				print("Link Quality Protocol", end='')
-			if (working_character == 0xCA):
-				print("Appletalk", end='')
-			if (working_character == 0xCC):
-				print("ARPA Internet Protocol", end='')
-			if (working_character == 0xCD):
-				print("ARPA Address Resolution", end='')
-			if (working_character == 0xCF):
-				print("TheNET (NET/ROM)", end='')
-			if (working_character == 0xF0):
-				print("No Layer 3", end='')
-			if (working_character == 0xFF):
-				print("Escape", end='')
-
-		index = index + 1
-
-		# return the index of the start of payload data
-		print(" ")
-	return index
+	header = ax25.DecodeAX25Header(frame)
+	if header is None:
+		return 0
+	print("- AX.25 Decode:")
+	print(ax25.FormatAX25Header(header) + ' ')
+	return header.payload_offset
 
 def print_frame(frame, time, count):
-	print("\r\n-- ", end='')
-	print(time, end=' ')
-	frame_len = len(frame)
-	print("frame number: %d" % count, end=' ')
-	print("byte count: ", frame_len, end='\r\n')
-	frame_lines = (frame_len // 16)
-	if (frame_len % 16) > 0:
-		frame_lines += 1
-	last_line_len = frame_len - (frame_lines * 16)
-	frame_index = 0
-	for line in range(0, frame_lines):
-		for i in range(0, 16):
-			if frame_index < frame_len:
-				if frame[frame_index] < 0x20:
-					print('.', end='')
-				elif frame[frame_index] > 0x7E:
-					print('.', end='')
+	# Render the header and dump as one string and write it once.
+	sys.stdout.write(f'\r\n-- {time} frame number: {count} byte count:  {len(frame)}\r\n' + hexdump.DumpLines(frame))
+	sys.stdout.flush()
+
+def BuildTestFrame(sequence):
+	# TEST frame with random destination and source addresses, drawn from a
+	# block generated in bulk. Destination SSID with CRR bits set, source SSID
+	# with Address Extension Bit and RR bits. The frame number starts the
+	# payload when sequence is given, and random padding fills it out to
+	# target_payload_length. Returns the frame and its header length.
+	global address_block, address_index
+	if address_index >= len(address_block):
+		address_block = ax25.RandomAddressPairs(ADDRESS_BLOCK_PAIRS, rng=address_rng)
+		address_index = 0
+	frame = bytearray(address_block[address_index:address_index + ax25.ADDRESS_PAIR_LENGTH])
+	address_index += ax25.ADDRESS_PAIR_LENGTH
+	# Add Control field for TEST, no PID.
+	frame.append(0xE3)
+	frame_header_length = len(frame)
+	if sequence is not None:
+		frame.extend(bytearray(f'{sequence} ', 'UTF-8'))
+	payload_length = len(frame) - frame_header_length
+	# Pad payload to specified length:
+	if payload_length < target_payload_length:
+		frame.extend(payload_generator.take(target_payload_length - payload_length))
+	return frame, frame_header_length
+
+def SaturationStep(rate, count):
+	# Offers count frames at rate frames/s without waiting for replies, then
+	# waits for the stragglers until none are outstanding or loss_timeout has
+	# passed since the last send. Frames are built before the step starts, so
+	# building doesn't limit the rate. Returns a dict of figures for the step.
+	global saturation_sequence
+	first_sequence = saturation_sequence + 1
+	frames = []
+	for index in range(count):
+		saturation_sequence += 1
+		frame, frame_header_length = BuildTestFrame(saturation_sequence)
+		frames.append((saturation_sequence, frame, kiss.EncodeKISSFrame(frame, KISS_PORT, KISS_COMMAND)))
+	step_stats = stats.TransitStats()
+	step_in_flight = {}
+	counts = {'match': 0, 'mismatch': 0, 'late': 0}
+
+	def Receive(wait_time):
+		received = []
+		try:
+			received.append(rx_queue.get(timeout=wait_time))
+			while True:
+				received.append(rx_queue.get_nowait())
+		except queue.Empty:
+			pass
+		for receive_ns, rx_port_name, receive_frame in received:
+			if receive_frame is None:
+				print('Receive serial port failed.')
+				GracefulExit2(tx_port, rx_port, 0)
+			receive_frame = receive_frame[1:]
+			sequence = ParseSequence(receive_frame, frame_header_length)
+			if sequence in step_in_flight:
+				send_time, sent_frame = step_in_flight.pop(sequence)
+				if sent_frame == receive_frame:
+					counts['match'] += 1
+					receive_time = receive_ns / 1e9
+					step_stats.record(receive_time - send_time, len(receive_frame) - frame_header_length, receive_time)
 				else:
-					print(chr(frame[frame_index]), end='')
-				frame_index += 1
-			else:
-				print(' ', end='')
-		print(' | ', end='')
-		frame_index = line * 16
-		for i in range(0, 16):
-			if frame_index < frame_len:
-				print("%2X" % frame[frame_index], end=' ')
-				frame_index += 1
-		print('\r\n', end='', flush=True)
-
-def StringCallsignToArray(input_string, error_string, error_code):
-	output = [0x20, 0x20, 0x20, 0x20, 0x20, 0x20, 0]
-	callsign_length = 0
-	ssid_digits = 0
-	ssid = [0,0]
-	currently_reading = 'callsign'
-	input_string = input_string.upper()
-	input_string = bytes(input_string, 'UTF-8')
-	for character in input_string:
-		if currently_reading == 'callsign':
-			if character == bytes('-', 'UTF-8')[0]:
-				currently_reading = 'ssid'
+					counts['mismatch'] += 1
+			elif sequence is not None and sequence < first_sequence:
+				# Left over from an earlier step.
+				counts['late'] += 1
 			else:
-				output[callsign_length] = int(character)
-				callsign_length += 1
-				if callsign_length == 6:
-					currently_reading = 'hyphen'
-				# print(output)
-		elif currently_reading == 'hyphen':
-			if character != bytes('-', 'UTF-8')[0]:
-				print(error_string)
-				sys.exit(error_code)
-			currently_reading = 'ssid'
-		elif currently_reading == 'ssid':
-			ssid[ssid_digits] = character - bytes('0', 'UTF-8')[0]
-			ssid_digits += 1
-			# print(ssid)
-	if ssid_digits == 1:
-		ssid = ssid[0]
-	elif ssid_digits == 2:
-		ssid = ssid[0] * 10 + ssid[1]
-	else:
-		ssid = 0
-	if ssid > 16:
-		ssid = 16
-	if ssid < 0:
-		ssid = 0
-	output[6] = ssid
-	return output
+				counts['mismatch'] += 1
+
+	pacer = pacing.DeadlinePacer()
+	for sequence, frame, kiss_frame in frames:
+		pacer.wait()
+		send_time = timer()
+		tx_port.write(kiss_frame)
+		step_stats.start(send_time)
+		step_in_flight[sequence] = (send_time, frame)
+		pacer.advance(1 / rate)
+		Receive(0)
+	last_send_time = timer()
+	while len(step_in_flight) > 0 and timer() - last_send_time < loss_timeout:
+		Receive(min(0.1, max(0, last_send_time + loss_timeout - timer())))
+	summary = step_stats.summary()
+	summary['rate'] = rate
+	summary['send_rate'] = pacer.report()['rate']
+	summary['sent'] = count
+	summary['match'] = counts['match']
+	summary['mismatch'] = counts['mismatch']
+	summary['lost'] = len(step_in_flight)
+	summary['late'] = counts['late']
+	summary['loss'] = (count - counts['match']) / count
+	return summary
+
+def StepPasses(step):
+	# A rate is sustained when loss is within the threshold and frames come out
+	# as fast as they go in, not just into a growing queue.
+	return step['loss'] <= saturation_loss and step['receive_rate'] >= KEEP_UP_FRACTION * step['send_rate']
+
+def FormatStep(step):
+	return (f"{step['rate']:10.2f} {step['send_rate']:10.2f} {step['receive_rate']:10.2f} {100 * step['loss']:7.2f} "
+		f"{step['transit_p50'] * 1e3:10.1f} {step['transit_p99'] * 1e3:10.1f} {step['goodput']:10.1f}")
 
 if sys.version_info < (3, 0):
 	print("Python version should be 3.x, exiting")
 	sys.exit(1)
 
 if len(sys.argv) < 8:
-	print('Not enough arguments. Usage prototype below.\r\npython3 kiss-loop.py <tx serial device> <tx baud rate> <rx serial device> <rx baud rate> <frame count> <payload length> <frame interval>')
+	print('Not enough arguments. Usage prototype below.\r\npython3 kiss-loop.py <tx serial device> <tx baud rate> <rx serial device> <rx baud rate> <frame count> <payload length> <frame interval> <optional window=n> <optional timeout=seconds> <optional report=seconds> <optional json=file> <optional seed=n> <optional payload=printable|binary>')
 	sys.exit(2)
 
 try:
@@ -251,12 +181,6 @@ except:
 	print('Unable to open receive serial port.')
 	sys.exit(4)
 
-source_callsign = StringCallsignToArray(GenerateRandomCallsign(), 'Source Callsign or SSID is invalid.', 4)
-dest_callsign = StringCallsignToArray(GenerateRandomCallsign(), 'Destination Callsign or SSID is invalid.', 5)
-
-print(source_callsign)
-print(dest_callsign)
-
 try:
 	transmit_frame_count_target = int(sys.argv[5])
 except:
@@ -275,99 +199,233 @@ except:
 	print('Frame interval is not a number.')
 	GracefulExit2(tx_port, rx_port, 7)
 
+# Window mode keeps up to window_size frames in flight and matches them by the
+# frame number in the payload. 0 selects the original stop-and-wait behavior.
+window_size = 0
+# Seconds an in flight frame may go unanswered before it is counted lost.
+loss_timeout = 10.0
+# Seconds between statistics reports, 0 reports only at exit.
+report_interval = 10.0
+# Optional file to write the final statistics to as JSON.
+json_file_name = None
+# Seed for the random addresses and payloads, None for a different run each
+# time. Payload padding characters, see payloads.PayloadGenerator.
+random_seed = None
+payload_kind = 'printable'
+# Saturation mode loss threshold as a fraction, None for a normal run.
+saturation_loss = None
+# Bisection steps between the last passing and first failing rate.
+refine_steps = 4
+
+for option in sys.argv[8:]:
+	try:
+		if option.startswith('window='):
+			window_size = int(option[7:])
+		elif option.startswith('timeout='):
+			loss_timeout = float(option[8:])
+		elif option.startswith('report='):
+			report_interval = float(option[7:])
+		elif option.startswith('json='):
+			json_file_name = option[5:]
+		elif option.startswith('seed='):
+			random_seed = int(option[5:])
+		elif option.startswith('payload='):
+			payload_kind = option[8:]
+			if payload_kind not in payloads.PAYLOAD_KINDS:
+				raise ValueError
+		elif option.startswith('saturate='):
+			saturation_loss = float(option[9:]) / 100
+			if saturation_loss < 0 or saturation_loss >= 1:
+				raise ValueError
+		elif option.startswith('refine='):
+			refine_steps = int(option[7:])
+			if refine_steps < 0:
+				raise ValueError
+		else:
+			raise ValueError
+	except ValueError:
+		print(f'Invalid option {option}.')
+		GracefulExit2(tx_port, rx_port, 8)
 
-RX_FESC = 0xDB
-RX_FEND = 0xC0
-RX_TFESC = 0xDD
-RX_TFEND = 0xDC
+address_rng = random.Random(random_seed)
+payload_generator = payloads.PayloadGenerator(random_seed, payload_kind)
 
-FESC = int(0xDB).to_bytes(1,'big')
-FEND = int(0xC0).to_bytes(1,'big')
-TFESC = int(0xDD).to_bytes(1,'big')
-TFEND = int(0xDC).to_bytes(1,'big')
 KISS_PORT = 0
 KISS_COMMAND = 0
-KISS_TYPE_ID = (KISS_PORT * 16) + KISS_COMMAND
-KISS_TYPE_ID = KISS_TYPE_ID.to_bytes(1,'big')
 
 transmit_frame_counter = 0;
 transmit_trigger = False
 last_transmit_time = timer() - frame_interval
-
-rx_kiss_state = "non-escaped"
-receive_frame = []
+# Absolute time the next frame is due. default_timer is time.perf_counter, the
+# same clock the receive thread stamps frames with.
+next_transmit_time = timer()
+
+# Frames are received and timestamped at FEND on their own thread. Anything
+# left over from an earlier run is discarded first.
+rx_port.reset_input_buffer()
+rx_queue = queue.Queue()
+kiss.KISSReader(rx_port, rx_queue, sys.argv[3]).start()
 receive_match_count = 0
 receive_mismatch_count = 0
 receive_miss_count = 0
 
 receive_interlock = False
 
+# Window mode bookkeeping, keyed by frame number. Lost and received frames
+# keep their address header, so a frame from an earlier run with the same
+# number isn't taken for one of ours. They are kept for this many frames
+# behind the oldest one in flight, older ones count as stray.
+SEQUENCE_HISTORY = 4096
+in_flight = {}
+lost_frames = {}
+received_frames = {}
+history_floor = 0
+receive_late_count = 0
+receive_duplicate_count = 0
+receive_lost_count = 0
+receive_stray_count = 0
+header_length = 15
+# Address pairs are generated this many at a time.
+ADDRESS_BLOCK_PAIRS = 1024
+# Saturation mode doubles the rate at most this many times, and places the
+# latency knee where median transit time grows past this factor.
+MAX_RAMP_STEPS = 20
+LATENCY_KNEE_FACTOR = 2.0
+# Received rate a step must reach, as a fraction of the rate sent, to count as
+# sustained.
+KEEP_UP_FRACTION = 0.9
+address_block = b''
+address_index = 0
+
+transit_stats = stats.TransitStats()
+next_report_time = timer() + report_interval
+
+if saturation_loss is not None and transmit_frame_count_target < 2:
+	# A rate needs at least two frames to measure.
+	print('Saturation mode needs a frame count of at least 2.')
+	GracefulExit2(tx_port, rx_port, 5)
+
+if saturation_loss is not None:
+	# Double the offered rate until a step fails, then bisect between the last
+	# passing and first failing rate.
+	if frame_interval > 0:
+		rate = 1 / frame_interval
+	else:
+		rate = 1.0
+	saturation_sequence = 0
+	steps = []
+	passing_rate = None
+	failing_rate = None
+	host_limited = False
+	print(f'Saturation search, {transmit_frame_count_target} frames per step, {target_payload_length} byte payloads, loss threshold {100 * saturation_loss:g}%')
+	print(f'{"offered/s":>10} {"sent/s":>10} {"recv/s":>10} {"loss %":>7} {"p50 ms":>10} {"p99 ms":>10} {"goodput":>10}')
+	for ramp_step in range(MAX_RAMP_STEPS):
+		step = SaturationStep(rate, transmit_frame_count_target)
+		steps.append(step)
+		print(FormatStep(step))
+		sys.stdout.flush()
+		if not StepPasses(step):
+			failing_rate = rate
+			break
+		passing_rate = rate
+		if step['send_rate'] < KEEP_UP_FRACTION * rate:
+			# The host can't offer more, the link wasn't the limit.
+			host_limited = True
+			break
+		rate *= 2
+	if passing_rate is not None and failing_rate is not None and failing_rate > passing_rate:
+		for refine_step in range(refine_steps):
+			rate = (passing_rate * failing_rate) ** 0.5
+			step = SaturationStep(rate, transmit_frame_count_target)
+			steps.append(step)
+			print(FormatStep(step))
+			sys.stdout.flush()
+			if StepPasses(step):
+				passing_rate = rate
+			else:
+				failing_rate = rate
+	steps.sort(key=lambda step: step['rate'])
+	# The knee is the last sustained rate before median transit time doubles
+	# from the slowest step's.
+	knee_rate = None
+	if steps[0]['frames'] > 0:
+		for step in steps:
+			if not StepPasses(step) or step['transit_p50'] > LATENCY_KNEE_FACTOR * steps[0]['transit_p50']:
+				break
+			knee_rate = step['rate']
+	overflow_rate = next((step['rate'] for step in steps if step['loss'] > saturation_loss), None)
+	first_loss_rate = next((step['rate'] for step in steps if step['lost'] + step['mismatch'] > 0), None)
+	saturation = {
+		'steps': steps,
+		'loss_threshold': saturation_loss,
+		'payload_length': target_payload_length,
+		'max_rate': passing_rate,
+		'max_goodput': None,
+		'knee_rate': knee_rate,
+		'overflow_rate': overflow_rate,
+		'first_loss_rate': first_loss_rate,
+		'host_limited': host_limited,
+	}
+	print('\nSaturation results:')
+	if passing_rate is None:
+		print(f'No rate sustained, loss above {100 * saturation_loss:g}% from the first step.')
+	else:
+		passing_step = next(step for step in steps if step['rate'] == passing_rate)
+		saturation['max_goodput'] = passing_step['goodput']
+		print(f'Max sustained rate: {passing_rate:.2f} frames/s offered, {passing_step["receive_rate"]:.2f} frames/s received, goodput {passing_step["goodput"]:.1f} payload bytes/s')
+	if host_limited:
+		print('Host limited: frames could not be offered any faster, the link did not saturate.')
+	if knee_rate is not None:
+		print(f'Latency knee: {knee_rate:.2f} frames/s, median transit under {LATENCY_KNEE_FACTOR:g}x the slowest step')
+	if overflow_rate is not None:
+		print(f'Overflow: loss above {100 * saturation_loss:g}% from {overflow_rate:.2f} frames/s')
+	else:
+		print(f'Overflow: loss never went above {100 * saturation_loss:g}% at the rates tried')
+	if first_loss_rate is not None:
+		print(f'First loss at {first_loss_rate:.2f} frames/s')
+	if json_file_name is not None:
+		try:
+			with open(json_file_name, 'w') as json_file:
+				json.dump(saturation, json_file, indent=1)
+		except OSError:
+			print('Unable to write statistics file.')
+			GracefulExit2(tx_port, rx_port, 9)
+	print('\nDone.')
+	GracefulExit2(tx_port, rx_port, 0)
+
 keep_going = True
 
 #for transmit_frame_counter in range(0, transmit_frame_count_target):
 while keep_going:
-	if timer() - last_transmit_time > frame_interval:
-		transmit_trigger = True
+	now = timer()
+	transmit_trigger = False
 	keep_going = False
 	if transmit_frame_count_target > transmit_frame_counter:
 		keep_going = True
-	else:
-		transmit_trigger = False
-	if timer() - last_transmit_time < frame_interval:
+		if now >= next_transmit_time:
+			transmit_trigger = True
+	if now - last_transmit_time < frame_interval:
 		keep_going = True
-		
+	if window_size > 0:
+		if len(in_flight) > 0:
+			keep_going = True
+		if len(in_flight) >= window_size:
+			transmit_trigger = False
 
 	
 	if transmit_trigger == True:
 		transmit_trigger = False
-		if receive_interlock == True:
+		if receive_interlock == True and window_size == 0:
 			receive_interlock = False
 			receive_miss_count += 1
 			print(f'Receive miss, count:{receive_miss_count}')
 		receive_interlock = True
 		transmit_frame_counter += 1
 		# Assemble KISS frame:
-		transmit_frame = bytearray()
-		source_callsign = StringCallsignToArray(GenerateRandomCallsign(), 'Source Callsign or SSID is invalid.', 4)
-		dest_callsign = StringCallsignToArray(GenerateRandomCallsign(), 'Destination Callsign or SSID is invalid.', 5)
-		# Add destination callsign, shifted left one bit:
-		for j in range(6):
-			transmit_frame.extend((dest_callsign[j]<<1).to_bytes(1,'big'))
-		# Add destination SSID with CRR bits set
-		transmit_frame.extend((((dest_callsign[6] & 0xF)<<1) | 0xE0).to_bytes(1,'big'))
-		# Add source callsign, shifted left one bit:
-		for k in range(6):
-			transmit_frame.extend((source_callsign[k]<<1).to_bytes(1,'big'))
-		# Add source SSID with Address Extension Bit and RR bits:
-		transmit_frame.extend((((source_callsign[6] & 0xF) << 1) | 0x61).to_bytes(1,'big'))
-
-		# Add Control field for TEST:
-		transmit_frame.extend((0xE3).to_bytes(1,'big'))
-		# Add PID for No Layer 3:
-		#transmit_frame.extend((0xF0).to_bytes(1,'big'))
-
-		# save the length of the kiss frame for payload length computations later
-		payload_length = len(transmit_frame)
-
-
-		#transmit_frame.extend(payload)
-		#payload = bytearray(payload_text, 'UTF-8')
-		#transmit_frame.extend(payload)
-		
-		if target_payload_length > 1:
-			transmit_frame.extend(bytearray(str(transmit_frame_counter), 'UTF-8'))
-			transmit_frame.extend(bytearray(" ", 'UTF-8'))
-
-		payload_length = len(transmit_frame) - payload_length
-		#print(payload_length)
-
-		# Pad payload to specified length:
-		if payload_length < target_payload_length:
-			payload = bytearray()
-			for j in range(0, target_payload_length - payload_length):
-				rand = random.randint(32,126)
-				payload.extend(bytearray(rand.to_bytes(1,'big')))
-			transmit_frame.extend(payload)
+		if target_payload_length > 1 or window_size > 0:
+			transmit_frame, header_length = BuildTestFrame(transmit_frame_counter)
+		else:
+			transmit_frame, header_length = BuildTestFrame(None)
 
 		print(f'Sending Frame {transmit_frame_counter} CRC value: {crc.CalcCRC16(transmit_frame)}')
 		character_counter = 0
@@ -379,70 +437,148 @@ while keep_going:
 				# print(f'\n', end='')
 		#sys.stdout.flush()
 
-		frame_index = 0
-		transmit_kiss_frame = bytearray()
-		while(frame_index < len(transmit_frame)):
-			kiss_byte = transmit_frame[frame_index]
-			if kiss_byte.to_bytes(1,'big') == FESC:
-				transmit_kiss_frame.extend(FESC)
-				transmit_kiss_frame.extend(TFESC)
-			elif kiss_byte.to_bytes(1, 'big') == FEND:
-				transmit_kiss_frame.extend(FESC)
-				transmit_kiss_frame.extend(TFEND)
-			else:
-				transmit_kiss_frame.extend(kiss_byte.to_bytes(1, 'big'))
-			frame_index += 1
-		transmit_kiss_frame = bytearray(FEND) + bytearray(KISS_TYPE_ID) + transmit_kiss_frame + bytearray(FEND)
-		tx_port.write(transmit_kiss_frame)
+		transmit_kiss_frame = kiss.EncodeKISSFrame(transmit_frame, KISS_PORT, KISS_COMMAND)
+		# Stamp before the write, a fast link can deliver the frame before write() returns.
 		last_transmit_time = timer()
+		tx_port.write(transmit_kiss_frame)
+		transit_stats.start(last_transmit_time)
+		next_transmit_time += frame_interval
+		if next_transmit_time < last_transmit_time:
+			# Fell behind, resume from now rather than bursting to catch up.
+			next_transmit_time = last_transmit_time
+		if window_size > 0:
+			in_flight[transmit_frame_counter] = (last_transmit_time, transmit_frame)
+
+	# Sleep until the next deadline: the next transmission, the end of the run,
+	# or the oldest in flight frame timing out. An arriving frame wakes us early.
+	deadlines = []
+	if transmit_frame_count_target > transmit_frame_counter:
+		if window_size == 0 or len(in_flight) < window_size:
+			deadlines.append(next_transmit_time)
+	else:
+		deadlines.append(last_transmit_time + frame_interval)
+	if len(in_flight) > 0:
+		deadlines.append(next(iter(in_flight.values()))[0] + loss_timeout)
+	if report_interval > 0:
+		deadlines.append(next_report_time)
+	wait_time = 0
+	if keep_going and len(deadlines) > 0:
+		wait_time = max(0, min(deadlines) - timer())
+	received = []
+	try:
+		received.append(rx_queue.get(timeout=wait_time))
+		while True:
+			received.append(rx_queue.get_nowait())
+	except queue.Empty:
+		pass
 
-	rx_serial_data = rx_port.read(1)
-	if rx_serial_data:
-		if rx_kiss_state == "non-escaped":
-			if ord(rx_serial_data) == RX_FESC:
-				rx_kiss_state = "escaped"
-			elif ord(rx_serial_data) == RX_FEND:
-				receive_time = timer()
-				if len(receive_frame) > 0:
-					receive_interlock = False
-					# create an integer version of transmit_frame
-					transmit_frame_int = [x for x in transmit_frame]
-					# strip KISS command byte from receive frame
-					receive_frame = receive_frame[1:]
-					if transmit_frame_int == receive_frame:
-						receive_match_count += 1
-						print(f'Receive match, count:{receive_match_count}, transit time:{receive_time - last_transmit_time}')
-					else:
-						receive_mismatch_count += 1
-						print(f'Receive MISMATCH, count:{receive_mismatch_count}')
-						print(f'Sent frame:\n{transmit_frame_int}')
-						print(f'Receive frame:\n{receive_frame}')
-					#t = datetime.datetime.now()
-					#kiss_frame_time = time.strftime("%H:%M:%S", t)
-					#print_frame(kiss_frame, t, frame_count)
-					#header_length = print_ax25_header(receive_frame)
-					#receive_frame_string = ""
-					#for receive_character in receive_frame[header_length:]:
-						#kiss_frame_string += chr(character)
-					#print(kiss_frame_string)
-					#kiss_frame = []
-					receive_frame = []
+	for receive_ns, rx_port_name, receive_frame in received:
+		if receive_frame is None:
+			print('Receive serial port failed.')
+			keep_going = False
+			break
+		receive_time = receive_ns / 1e9
+		receive_interlock = False
+		# strip KISS command byte from receive frame
+		receive_frame = receive_frame[1:]
+		if window_size > 0:
+			sequence = ParseSequence(receive_frame, header_length)
+			receive_header = receive_frame[:header_length]
+			if sequence in in_flight and in_flight[sequence][1][:header_length] == receive_header:
+				send_time, sent_frame = in_flight.pop(sequence)
+				received_frames[sequence] = receive_header
+				if sent_frame == receive_frame:
+					receive_match_count += 1
+					transit_stats.record(receive_time - send_time, len(receive_frame) - header_length, receive_time)
+					print(f'Receive match, frame:{sequence}, count:{receive_match_count}, in flight:{len(in_flight)}, transit time:{receive_time - send_time}')
 				else:
-					receive_frame = []
+					receive_mismatch_count += 1
+					print(f'Receive MISMATCH, frame:{sequence}, count:{receive_mismatch_count}')
+					print(f'Sent frame:\n{list(sent_frame)}')
+					print(f'Receive frame:\n{list(receive_frame)}')
+			elif sequence in lost_frames and lost_frames[sequence] == receive_header:
+				del lost_frames[sequence]
+				received_frames[sequence] = receive_header
+				receive_late_count += 1
+				receive_lost_count -= 1
+				print(f'Receive LATE, frame:{sequence}, count:{receive_late_count}')
+			elif sequence in received_frames and received_frames[sequence] == receive_header:
+				receive_duplicate_count += 1
+				print(f'Receive DUPLICATE, frame:{sequence}, count:{receive_duplicate_count}')
 			else:
-				receive_frame.append(ord(rx_serial_data))
-		elif rx_kiss_state == "escaped":
-			print('e', end='')
-			if ord(rx_serial_data) == RX_TFESC:
-				receive_frame.append(RX_FESC)
-				rx_kiss_state = "non-escaped"
-			elif ord(rx_serial_data) == RX_TFEND:
-				receive_frame.append(RX_FEND)
-				rx_kiss_state = "non-escaped"
+				# Not sent in this run, or its header was corrupted, in which case
+				# the frame it should have been counts as lost.
+				receive_stray_count += 1
+				print(f'Receive STRAY, unknown frame, count:{receive_stray_count}')
+				print(f'Receive frame:\n{list(receive_frame)}')
+			continue
+		if transmit_frame == receive_frame:
+			receive_match_count += 1
+			transit_stats.record(receive_time - last_transmit_time, len(receive_frame) - header_length, receive_time)
+			print(f'Receive match, count:{receive_match_count}, transit time:{receive_time - last_transmit_time}')
+		else:
+			receive_mismatch_count += 1
+			print(f'Receive MISMATCH, count:{receive_mismatch_count}')
+			print(f'Sent frame:\n{list(transmit_frame)}')
+			print(f'Receive frame:\n{list(receive_frame)}')
+
+	if window_size > 0:
+		# Frames unanswered for loss_timeout are lost, unless they turn up later.
+		expire_time = timer() - loss_timeout
+		expired = []
+		# in_flight is in send order, so stop at the first frame still in time.
+		for sequence, (send_time, sent_frame) in in_flight.items():
+			if send_time >= expire_time:
+				break
+			expired.append(sequence)
+		for sequence in expired:
+			lost_frames[sequence] = in_flight.pop(sequence)[1][:header_length]
+			receive_lost_count += 1
+			print(f'Receive LOST, frame:{sequence}, count:{receive_lost_count}')
+		# Prune in batches of SEQUENCE_HISTORY so the tables stay bounded on long
+		# runs without being rebuilt every frame.
+		oldest_sequence = next(iter(in_flight), transmit_frame_counter + 1)
+		if oldest_sequence - history_floor > 2 * SEQUENCE_HISTORY:
+			history_floor = oldest_sequence - SEQUENCE_HISTORY
+			lost_frames = {sequence: header for sequence, header in lost_frames.items() if sequence >= history_floor}
+			received_frames = {sequence: header for sequence, header in received_frames.items() if sequence >= history_floor}
+
+	if report_interval > 0 and timer() >= next_report_time:
+		next_report_time += report_interval
+		print(f'\nStatistics:\n{stats.FormatSummary(transit_stats.summary(timer()))}\n')
 print('\nFinal status:')
 print(f'Receive Match Count: {receive_match_count}')
 print(f'Receive Mismatch Count: {receive_mismatch_count}')
-print(f'Receive Miss Count: {receive_miss_count}')
+if window_size > 0:
+	print(f'Receive Late Count: {receive_late_count}')
+	print(f'Receive Duplicate Count: {receive_duplicate_count}')
+	print(f'Receive Lost Count: {receive_lost_count}')
+	print(f'Receive Stray Count: {receive_stray_count}')
+else:
+	print(f'Receive Miss Count: {receive_miss_count}')
+summary = transit_stats.summary()
+print(stats.FormatSummary(summary))
+
+if json_file_name is not None:
+	summary['sent'] = transmit_frame_counter
+	summary['match'] = receive_match_count
+	summary['mismatch'] = receive_mismatch_count
+	if window_size > 0:
+		summary['late'] = receive_late_count
+		summary['duplicate'] = receive_duplicate_count
+		summary['lost'] = receive_lost_count
+		summary['stray'] = receive_stray_count
+	else:
+		summary['miss'] = receive_miss_count
+	summary['payload_length'] = target_payload_length
+	summary['frame_interval'] = frame_interval
+	summary['window'] = window_size
+	try:
+		with open(json_file_name, 'w') as json_file:
+			json.dump(summary, json_file, indent=1)
+	except OSError:
+		print('Unable to write statistics file.')
+		GracefulExit2(tx_port, rx_port, 9)
 
 print('\nDone.')
 GracefulExit2(tx_port, rx_port, 0)
@@ -0,0 +1,140 @@
+# kiss-replay
+# Python3
+# Replay frames from a pcap/pcapng capture or a raw KISS log to a serial port.
+# Exit codes
+# 1 Wrong python version
+# 2 Not enough command line arguments
+# 3 Unable to open serial port
+# 4 Unable to read capture file
+# 5 Invalid option
+
+import serial
+import sys
+import kiss
+import pcap
+import pacing
+
+def GracefulExit(port, code):
+	try:
+		port.close()
+	except:
+		pass
+	finally:
+		sys.exit(code)
+
+def LoadCapture(file_name):
+	# Returns a list of (timestamp_ns, KISS encoded frame) and a count of
+	# packets with a link type that can't be sent. Raw KISS logs carry no
+	# timing, so their timestamps are None.
+	frames = []
+	skipped = 0
+	if pcap.IsCaptureFile(file_name):
+		for timestamp, link_type, frame in pcap.ReadCapture(file_name):
+			if link_type == pcap.LINKTYPE_AX25_KISS and len(frame) > 1:
+				# Keep the recorded KISS port and command.
+				frames.append((timestamp, kiss.EncodeKISSFrame(frame[1:], frame[0] >> 4, frame[0] & 0xF)))
+			elif link_type == pcap.LINKTYPE_AX25 and len(frame) > 0:
+				frames.append((timestamp, kiss.EncodeKISSFrame(frame)))
+			else:
+				skipped += 1
+	else:
+		deframer = kiss.KISSDeframer()
+		with open(file_name, 'rb') as file:
+			for frame in deframer.feed(file.read() + kiss.FEND_BYTE):
+				frames.append((None, kiss.EncodeKISSFrame(frame[1:], frame[0] >> 4, frame[0] & 0xF)))
+	return frames, skipped
+
+if sys.version_info < (3, 0):
+	print("Python version should be 3.x, exiting")
+	sys.exit(1)
+
+if len(sys.argv) < 4:
+	print('Not enough arguments. Usage prototype below.\r\npython3 kiss-replay.py <serial device> <baud rate> <capture file> <optional speed=multiplier> <optional fast> <optional interval=seconds>')
+	sys.exit(2)
+
+# Recorded gaps are divided by speed. fast sends frames back to back. interval
+# spaces frames that have no recorded time, which is every frame of a raw KISS
+# log.
+speed = 1.0
+fast = False
+untimed_interval = 0.0
+
+for option in sys.argv[4:]:
+	try:
+		if option.startswith('speed='):
+			speed = float(option[6:])
+			if speed <= 0:
+				raise ValueError
+		elif option == 'fast':
+			fast = True
+		elif option.startswith('interval='):
+			untimed_interval = float(option[9:])
+			if untimed_interval < 0:
+				raise ValueError
+		else:
+			raise ValueError
+	except ValueError:
+		print(f'Invalid option {option}.')
+		sys.exit(5)
+
+try:
+	frames, skipped_count = LoadCapture(sys.argv[3])
+except:
+	print(f'Unable to read capture file {sys.argv[3]}.')
+	sys.exit(4)
+
+print(f'Loaded {len(frames)} frames from {sys.argv[3]}.')
+if skipped_count > 0:
+	print(f'Skipped {skipped_count} packets that are not AX.25.')
+
+try:
+	port = serial.Serial(sys.argv[1], baudrate=sys.argv[2], bytesize=8, parity='N', stopbits=1, xonxoff=0, rtscts=0, timeout=3)
+except:
+	print('Unable to open serial port.')
+	sys.exit(3)
+
+pacer = pacing.DeadlinePacer()
+byte_count = 0
+last_timestamp = None
+recorded_span = 0.0
+timed_count = 0
+
+try:
+	for timestamp, kiss_frame in frames:
+		# Every gap is measured from the previous deadline, so time spent writing
+		# doesn't accumulate as drift. The recorded rate is added up in fast mode
+		# too, to compare against.
+		if pacer.next_deadline is not None:
+			if timestamp is not None and last_timestamp is not None:
+				# Out of order timestamps replay back to back.
+				gap = max(0, timestamp - last_timestamp) / 1e9
+				recorded_span += gap
+				timed_count += 1
+				if not fast:
+					pacer.advance(gap / speed)
+			elif not fast:
+				pacer.advance(untimed_interval)
+		if timestamp is not None:
+			last_timestamp = timestamp
+		pacer.wait()
+		port.write(kiss_frame)
+		byte_count += len(kiss_frame)
+except KeyboardInterrupt:
+	pass
+
+report = pacer.report()
+print('Done.')
+if fast:
+	# Nothing was scheduled, so there's no target, lateness or drift to report.
+	print(f"Sent {report['events']} frames in {report['elapsed']:.3f} s. Rate {report['rate']:.3f}/s.")
+else:
+	print(pacing.FormatReport(report))
+if recorded_span > 0:
+	recorded_rate = timed_count / recorded_span
+	if fast:
+		print(f'Recorded rate {recorded_rate:.3f} frames/s, replayed at {report["rate"]:.3f} frames/s ({report["rate"] / recorded_rate:.2f}x, fast).')
+	else:
+		print(f'Recorded rate {recorded_rate:.3f} frames/s, replayed at {report["rate"]:.3f} frames/s ({report["rate"] / recorded_rate:.2f}x, speed {speed:g}x).')
+if report['elapsed'] > 0:
+	print(f'Wrote {byte_count} bytes, {byte_count / report["elapsed"]:.1f} bytes/s.')
+GracefulExit(port, 0)
@@ -0,0 +1,184 @@
+# KISS framing shared by the tnc-tools scripts.
+
+import threading
+import time
+import crc
+
+FEND = 0xC0
+FESC = 0xDB
+TFEND = 0xDC
+TFESC = 0xDD
+
+FEND_BYTE = b'\xC0'
+FESC_BYTE = b'\xDB'
+ESCAPED_FEND = b'\xDB\xDC'
+ESCAPED_FESC = b'\xDB\xDD'
+
+def EscapeKISS(data):
+	# Bulk FESC/FEND escaping. FESC must be escaped first so the FESC bytes
+	# inserted for FEND are not escaped again.
+	if FESC_BYTE in data:
+		data = data.replace(FESC_BYTE, ESCAPED_FESC)
+	if FEND_BYTE in data:
+		data = data.replace(FEND_BYTE, ESCAPED_FEND)
+	return data
+
+def EncodeKISSFrame(frame, port=0, command=0):
+	# Returns FEND, type byte, escaped frame, FEND. The type byte holds the KISS
+	# port in the high nibble and the command in the low nibble.
+	if not isinstance(frame, (bytes, bytearray)):
+		frame = bytes(frame)
+	frame = EscapeKISS(frame)
+	type_id = ((port & 0xF) << 4) | (command & 0xF)
+	if type_id == FEND or type_id == FESC:
+		# Ports 12 and 13 put a special character in the type byte.
+		return bytearray(FEND_BYTE + EscapeKISS(bytes([type_id])) + frame + FEND_BYTE)
+	# Preallocate the whole output frame and fill it in place.
+	output = bytearray(len(frame) + 3)
+	output[0] = FEND
+	output[1] = type_id
+	output[2:-1] = frame
+	output[-1] = FEND
+	return output
+
+def UnescapeKISS(data):
+	# Every FESC in a well formed stream starts an escape pair, so replacing the
+	# TFEND pairs first can never split a TFESC pair.
+	if FESC_BYTE in data:
+		data = data.replace(ESCAPED_FEND, FEND_BYTE).replace(ESCAPED_FESC, FESC_BYTE)
+	return bytes(data)
+
+# Largest unescaped frame accepted by default, including the type byte.
+MAX_FRAME_SIZE = 4096
+
+class KISSDeframer:
+	# Splits a KISS byte stream into unescaped frames. Data may be fed in chunks
+	# of any size, partial frames are held until their closing FEND arrives.
+	# Frames longer than max_frame_size are discarded and counted, so a lost FEND
+	# can't grow the buffer without bound. With with_crc, each frame comes out
+	# as (frame, FCS) where the FCS covers the frame after its type byte. A
+	# partial frame is hashed as it is held, so at FEND only the tail is left.
+
+	def __init__(self, max_frame_size=MAX_FRAME_SIZE, with_crc=False):
+		self.max_frame_size = max_frame_size
+		self.with_crc = with_crc
+		self.oversize_count = 0
+		self._buffer = bytearray()
+		self._discarding = False
+		self._ResetCRC()
+
+	def _ResetCRC(self):
+		# CRC of the held partial frame, the escaped bytes of the buffer already
+		# hashed, and whether its type byte has been skipped.
+		self._crc = crc.CRC16()
+		self._crc_offset = 0
+		self._crc_type_seen = False
+
+	def _HashEscaped(self, escaped):
+		data = UnescapeKISS(escaped)
+		if not self._crc_type_seen:
+			if len(data) == 0:
+				return
+			data = data[1:]
+			self._crc_type_seen = True
+		self._crc.update(data)
+
+	def feed(self, data):
+		# Returns a list of the frames completed by data, each starting with the
+		# KISS type byte, or (frame, FCS) pairs with with_crc. Empty frames (back
+		# to back FENDs) are skipped.
+		frames = []
+		last_fend = data.rfind(FEND_BYTE)
+		if last_fend < 0:
+			self._Hold(data)
+			return frames
+		self._buffer += data[:last_fend]
+		segments = self._buffer.split(FEND_BYTE)
+		if self._discarding:
+			# The first segment is the tail of an oversize frame.
+			segments[0] = b''
+			self._discarding = False
+		for index, segment in enumerate(segments):
+			if len(segment) > 0:
+				frame = UnescapeKISS(segment)
+				if len(frame) > self.max_frame_size:
+					self.oversize_count += 1
+				elif self.with_crc:
+					if index == 0:
+						# Continues the held frame, hash what arrived since.
+						self._HashEscaped(segment[self._crc_offset:])
+						fcs = self._crc.intdigest()
+					else:
+						fcs = crc.CRC16(frame[1:]).intdigest()
+					frames.append((frame, fcs))
+				else:
+					frames.append(frame)
+		self._buffer = bytearray()
+		if self.with_crc:
+			self._ResetCRC()
+		self._Hold(data[last_fend + 1:])
+		return frames
+
+	def read(self, port):
+		# Read whatever the port has waiting, blocking for at most the port
+		# timeout when nothing is waiting, and return the completed frames.
+		return self.feed(port.read(port.in_waiting or 1))
+
+	def _Hold(self, data):
+		if self._discarding:
+			return
+		self._buffer += data
+		# An escaped frame is at most twice its unescaped length.
+		if len(self._buffer) > 2 * self.max_frame_size:
+			self.oversize_count += 1
+			self._buffer = bytearray()
+			self._discarding = True
+			if self.with_crc:
+				self._ResetCRC()
+		elif self.with_crc:
+			# A trailing FESC starts an escape pair whose second byte is still to
+			# come, leave it for the next chunk.
+			end = len(self._buffer)
+			if end > self._crc_offset and self._buffer[end - 1] == FESC:
+				end -= 1
+			if end > self._crc_offset:
+				self._HashEscaped(self._buffer[self._crc_offset:end])
+				self._crc_offset = end
+
+# Held while a reader stamps and queues frames, so frames from several readers
+# sharing one queue arrive in timestamp order.
+_stamp_lock = threading.Lock()
+
+class KISSReader(threading.Thread):
+	# Reads KISS frames from a serial port on a daemon thread. Each frame is put
+	# on frame_queue as (perf_counter_ns timestamp, tag, frame), stamped when the
+	# read that completed it returns. When the port fails, (timestamp, tag, None)
+	# is queued and the thread ends. With with_crc the entries are (timestamp,
+	# tag, frame, FCS), and (timestamp, tag, None, None) when the port fails.
+
+	def __init__(self, port, frame_queue, tag=None, max_frame_size=MAX_FRAME_SIZE, with_crc=False):
+		threading.Thread.__init__(self, daemon=True)
+		self.port = port
+		self.frame_queue = frame_queue
+		self.tag = tag
+		self.with_crc = with_crc
+		self.deframer = KISSDeframer(max_frame_size, with_crc)
+
+	def run(self):
+		while True:
+			try:
+				frames = self.deframer.read(self.port)
+			except:
+				if self.with_crc:
+					self.frame_queue.put((time.perf_counter_ns(), self.tag, None, None))
+				else:
+					self.frame_queue.put((time.perf_counter_ns(), self.tag, None))
+				return
+			if frames:
+				with _stamp_lock:
+					timestamp = time.perf_counter_ns()
+					for frame in frames:
+						if self.with_crc:
+							self.frame_queue.put((timestamp, self.tag) + frame)
+						else:
+							self.frame_queue.put((timestamp, self.tag, frame))
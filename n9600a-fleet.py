@@ -0,0 +1,196 @@
+# n9600a-fleet
+# Python3
+# Send the same commands to many n9600a TNCs at once and collect the results.
+# Exit codes
+# 1 Wrong python version
+# 2 Not enough command line arguments
+# 3 Unable to read device or command file
+# 4 Invalid command
+# 5 Invalid or missing value
+# 6 Invalid option
+# 7 One or more devices failed
+# 8 Unable to write results file
+# 9 Invalid baud rate
+
+import serial
+import sys
+import json
+import os
+import time
+import math
+import concurrent.futures
+import n9600a
+import hexdump
+
+def ReadList(argument, separator):
+	# Items from a separated list, or one per line from @file.
+	if argument.startswith('@'):
+		with open(argument[1:], 'r') as list_file:
+			return list_file.readlines()
+	return argument.split(separator)
+
+def RunDevice(device, baud, commands, timeout):
+	# Runs every command on one TNC within timeout seconds. Returns a dict with
+	# the status and the text of each query response, None for a query that
+	# timed out. The device is given up at its first timeout, a TNC that
+	# doesn't answer one query is unlikely to answer the next. Writes and the
+	# final drain are bounded by the same deadline, so a TNC that stops reading
+	# can't hold the port.
+	result = {'device': device, 'status': 'ok', 'responses': {}, 'elapsed': 0.0}
+	start_time = time.monotonic()
+	deadline = start_time + timeout
+	try:
+		port = serial.Serial(device, baudrate=baud, bytesize=8, parity='N', stopbits=1, xonxoff=0, rtscts=0, timeout=0.1, write_timeout=timeout)
+	except:
+		result['status'] = 'unable to open port'
+		return result
+	try:
+		port.flushInput()
+		port.flushOutput()
+		session = n9600a.CommandSession(port)
+		for label, command, kiss_output_frame in commands:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				result['status'] = 'timeout'
+				break
+			session.response_timeout = min(n9600a.RESPONSE_TIMEOUT, remaining)
+			port.write_timeout = remaining
+			response = session.run(command, kiss_output_frame)
+			if command.response:
+				if response is None:
+					result['status'] = 'timeout'
+					result['responses'][label] = None
+					break
+				else:
+					result['responses'][label] = n9600a.ResponseText(response)
+		if not session.drain(max(0, deadline - time.monotonic())):
+			result['status'] = 'timeout'
+	except serial.SerialTimeoutException:
+		result['status'] = 'timeout'
+	except:
+		result['status'] = 'port error'
+	finally:
+		port.close()
+	result['elapsed'] = time.monotonic() - start_time
+	return result
+
+if sys.version_info < (3, 0):
+	print("Python version should be 3.x, exiting")
+	sys.exit(1)
+
+if len(sys.argv) < 4:
+	print('Not enough arguments. Usage prototype below.\r\npython3 n9600a-fleet.py <baud> <devices, comma separated or @file> <commands, comma separated or @file> <optional workers=n> <optional timeout=seconds> <optional json=file>')
+	print('Example: python3 n9600a-fleet.py 57600 /dev/ttyACM0,/dev/ttyACM1 GETVER,GETSERNO')
+	sys.exit(2)
+
+try:
+	baud = int(sys.argv[1])
+	if baud <= 0:
+		raise ValueError
+except ValueError:
+	print('Invalid baud rate.')
+	sys.exit(9)
+
+try:
+	devices = [line.strip() for line in ReadList(sys.argv[2], ',') if line.strip()]
+	command_lines = ReadList(sys.argv[3], ',')
+except:
+	print('Unable to read device or command file.')
+	sys.exit(3)
+
+# (column label, Command, KISS frame) for each command, checked before any
+# port is opened.
+commands = []
+# Times each command name has been seen.
+name_counts = {}
+for line in command_lines:
+	parsed = n9600a.ParseCommandLine(line)
+	if parsed is None:
+		continue
+	try:
+		command, kiss_output_frame = n9600a.BuildCommand(parsed[0], parsed[1])
+	except n9600a.CommandError as error:
+		print(f'{line.strip()}: {error}')
+		if error.exit_code == 4:
+			sys.exit(4)
+		sys.exit(5)
+	# Repeated queries get their own column.
+	label = command.name + "'" * name_counts.get(command.name, 0)
+	name_counts[command.name] = name_counts.get(command.name, 0) + 1
+	commands.append((label, command, kiss_output_frame))
+
+# Parallel ports opened at once, every device by default so the run takes as
+# long as the slowest device. Seconds each device has for all of its commands.
+workers = max(1, len(devices))
+device_timeout = 10.0
+json_file_name = None
+
+for option in sys.argv[4:]:
+	try:
+		if option.startswith('workers='):
+			workers = int(option[8:])
+			if workers < 1:
+				raise ValueError
+		elif option.startswith('timeout='):
+			device_timeout = float(option[8:])
+			if device_timeout <= 0:
+				raise ValueError
+		elif option.startswith('json='):
+			json_file_name = option[5:]
+		else:
+			raise ValueError
+	except ValueError:
+		print(f'Invalid option {option}.')
+		sys.exit(6)
+
+# Seconds past its timeout a device gets to close its port before it is given
+# up on without waiting for it.
+OVERRUN_GRACE = 2.0
+
+start_time = time.monotonic()
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+futures = [executor.submit(RunDevice, device, baud, commands, device_timeout) for device in devices]
+# Devices run in rounds of workers, each round within the device timeout.
+collect_deadline = start_time + math.ceil(len(devices) / workers) * (device_timeout + OVERRUN_GRACE)
+results = []
+overrun = False
+for device, future in zip(devices, futures):
+	try:
+		results.append(future.result(timeout=max(0, collect_deadline - time.monotonic())))
+	except concurrent.futures.TimeoutError:
+		overrun = True
+		results.append({'device': device, 'status': 'timeout', 'responses': {}, 'elapsed': time.monotonic() - start_time})
+executor.shutdown(wait=not overrun)
+elapsed = time.monotonic() - start_time
+
+# One row per device, one column per query.
+query_labels = [label for label, command, kiss_output_frame in commands if command.response]
+table = [['device', 'status'] + query_labels]
+for result in results:
+	row = [result['device'], result['status']]
+	for label in query_labels:
+		text = result['responses'].get(label)
+		row.append('-' if text is None else hexdump.EscapeText(text.strip('\x00\r\n ').encode('latin-1')))
+	table.append(row)
+widths = [max(len(row[column]) for row in table) for column in range(len(table[0]))]
+for row in table:
+	print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+failed_count = len([result for result in results if result['status'] != 'ok'])
+print(f'\n{len(devices)} devices, {failed_count} failed, {elapsed:.2f} s.')
+
+if json_file_name is not None:
+	try:
+		with open(json_file_name, 'w') as json_file:
+			json.dump({'elapsed': elapsed, 'commands': [label for label, command, kiss_output_frame in commands], 'devices': results}, json_file, indent=1)
+	except:
+		print(f'Unable to write results file {json_file_name}.')
+		sys.exit(8)
+
+if overrun:
+	# A worker is stuck in the serial driver, and sys.exit would wait for it.
+	sys.stdout.flush()
+	os._exit(7)
+if failed_count > 0:
+	sys.exit(7)
+sys.exit(0)
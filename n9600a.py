@@ -0,0 +1,159 @@
+# N9600A NinoTNC command frames, and a session that sends them over one open
+# serial port.
+
+import time
+import kiss
+
+# Seconds to wait for the response to a query.
+RESPONSE_TIMEOUT = 2.0
+
+class Command:
+	# One command: its type byte and any sub command byte, the kind of value it
+	# takes (None, 'byte' for 0 to 255 or 'serial' for 8 characters), whether
+	# the TNC answers it, and the line printed when it is sent (None to stay
+	# quiet, as the original set commands do).
+
+	def __init__(self, name, prefix, value_kind, response, announce, help_text, fixed_value=b''):
+		self.name = name
+		self.prefix = bytes(prefix)
+		self.value_kind = value_kind
+		self.response = response
+		self.announce = announce
+		self.help_text = help_text
+		self.fixed_value = bytes(fixed_value)
+
+COMMANDS = {}
+for _command in [
+	Command('CLRSERNO', [0xA], None, False, None, 'Erases the stored TNC serial number. Perform before SETSERNO.', [0, 0, 0, 0, 0, 0, 0, 0]),
+	Command('SETSERNO', [0xA], 'serial', False, None, 'Sets the TNC serial number, value is 8 ASCII characters.'),
+	Command('GETSERNO', [0xE], None, True, 'get serial number', 'Queries and displays the TNC serial number.', [0]),
+	Command('SETBCNINT', [0x9, 0xF0], 'byte', False, None, 'Sets the beacon interval, value is minutes 0 to 255. 0 disables.'),
+	Command('GETVER', [0x8], None, True, 'get firmware version', 'Queries and displays the TNC firmware version.', [0]),
+	Command('STOPTX', [0x9, 0x0], None, False, 'stop tx', 'Stop the current transmission and flush queues.'),
+	Command('GETALL', [0xB], None, True, 'get all', 'Dump diagnostic data.', [0]),
+	Command('SETPERSIST', [0x2], 'byte', False, 'set persist', 'Set CSMA persistance value, 0 to 255.'),
+	Command('SETSLOT', [0x3], 'byte', False, 'set slot', 'Set CSMA slot time in 10mS units, 0 to 255.'),
+	Command('SETTXD', [0x1], 'byte', False, 'set tx delay', 'Set TX_DELAY in 10mS units, 0 to 255, if TX_DELAY pot set to zero.'),
+	Command('SETTXTAIL', [0x4], 'byte', False, 'set tx tail', 'Set TX_TAIL in 10mS units, 0 to 255. Supported on NinoTNC fw .36 and up.'),
+	Command('SETHW', [0x6], 'byte', False, 'set hardware', 'Issue SetHardware KISS command to the modem, passing one byte to it.'),
+	Command('GETRSSI', [0x9, 0xA7], None, True, 'get rssi', None),
+]:
+	COMMANDS[_command.name] = _command
+
+def HelpLines():
+	lines = []
+	for command in COMMANDS.values():
+		if command.help_text is None:
+			continue
+		usage = command.name
+		if command.value_kind == 'serial':
+			usage += ' xxxxxxxx'
+		elif command.value_kind == 'byte':
+			usage += ' nnn'
+		lines.append(f'{usage:<22} : {command.help_text}')
+	return lines
+
+class CommandError(ValueError):
+	# A command line that can't be sent. exit_code is the n9600a-cmd.py exit
+	# code for it.
+
+	def __init__(self, message, exit_code):
+		super().__init__(message)
+		self.exit_code = exit_code
+
+def AssembleKISSFrame(input_array):
+	# The first byte of a command is the KISS type byte.
+	return kiss.EncodeKISSFrame(input_array[1:], input_array[0] >> 4, input_array[0] & 0xF)
+
+def BuildCommand(command_string, value_string=None):
+	# Returns (Command, KISS frame) for a command name and its value. Raises
+	# CommandError for an unknown command or a missing or invalid value.
+	command = COMMANDS.get(command_string.upper())
+	if command is None:
+		raise CommandError('Unrecognized command.', 4)
+	value = bytearray(command.fixed_value)
+	if command.value_kind == 'serial':
+		if value_string is None:
+			raise CommandError(f'Not enough arguments for {command.name} command.', 2)
+		value.extend(bytes(value_string, 'ascii'))
+		if len(value) < 8:
+			raise CommandError(f'Invalid value for {command.name} command. Must be 8 characters.', 5)
+	elif command.value_kind == 'byte':
+		if value_string is None:
+			raise CommandError(f'Not enough arguments for {command.name} command.', 2)
+		try:
+			value_int = int(value_string)
+		except ValueError:
+			value_int = -1
+		if value_int < 0 or value_int > 255:
+			raise CommandError(f'Invalid value for {command.name} command. Must be 0 to 255.', 5)
+		value.append(value_int)
+	return command, AssembleKISSFrame(command.prefix + bytes(value))
+
+def ParseCommandLine(line):
+	# Returns (command, value) from a 'COMMAND value' line, or None for a blank
+	# line or a comment starting with #.
+	line = line.strip()
+	if len(line) == 0 or line.startswith('#'):
+		return None
+	words = line.split(None, 1)
+	if len(words) == 1:
+		return words[0], None
+	return words[0], words[1].strip()
+
+def ResponseText(frame):
+	# The response after its KISS type byte, one character per byte.
+	return bytes(frame[1:]).decode('latin-1')
+
+class CommandSession:
+	# Sends commands over one open port. Commands without a response are
+	# written back to back, a query is written and its response returned as
+	# soon as the frame completes. Only a frame with the query's command in its
+	# KISS type byte counts as the response, frames heard over the air and
+	# late replies to earlier queries are dropped.
+
+	def __init__(self, port, response_timeout=RESPONSE_TIMEOUT):
+		self.port = port
+		self.response_timeout = response_timeout
+		self._deframer = kiss.KISSDeframer()
+		self.dropped_count = 0
+
+	def send(self, kiss_frame):
+		self.port.write(kiss_frame)
+
+	def query(self, kiss_frame, command_code):
+		# Returns the response frame, starting with its KISS type byte, or None
+		# when none completes within response_timeout. command_code is the low
+		# nibble of the query's type byte. Anything already waiting belongs to
+		# earlier traffic and is discarded first.
+		self.port.flushInput()
+		self._deframer = kiss.KISSDeframer()
+		self.send(kiss_frame)
+		deadline = time.monotonic() + self.response_timeout
+		while time.monotonic() <= deadline:
+			for frame in self._deframer.read(self.port):
+				if frame[0] & 0xF == command_code:
+					return frame
+				self.dropped_count += 1
+		return None
+
+	def run(self, command, kiss_frame):
+		# Sends a built command. Returns the response frame for a query, None
+		# on timeout, and b'' for a command without a response.
+		if command.response:
+			return self.query(kiss_frame, command.prefix[0] & 0xF)
+		self.send(kiss_frame)
+		return b''
+
+	def drain(self, timeout=None):
+		# Blocks until everything written has left the port. With a timeout,
+		# gives up after that many seconds and returns False.
+		if timeout is None:
+			self.port.flush()
+			return True
+		deadline = time.monotonic() + timeout
+		while self.port.out_waiting > 0:
+			if time.monotonic() >= deadline:
+				return False
+			time.sleep(0.01)
+		return True
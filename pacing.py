@@ -0,0 +1,69 @@
+# Absolute deadline pacing for the frame generators.
+
+import time
+
+class DeadlinePacer:
+	# Schedules events against absolute deadlines on the perf_counter clock, so
+	# time spent between events (building, printing, writing a frame) is absorbed
+	# instead of adding to the period. Keeps figures on how closely the achieved
+	# schedule followed the target.
+
+	def __init__(self):
+		self.next_deadline = None
+		self.first_event_time = None
+		self.last_event_time = None
+		self.last_deadline = None
+		self.event_count = 0
+		self.lateness_sum = 0.0
+		self.lateness_max = 0.0
+
+	def wait(self):
+		# Sleep until the current deadline, returns the time of the event. The
+		# first call starts the schedule without waiting.
+		now = time.perf_counter()
+		if self.next_deadline is None:
+			self.next_deadline = now
+		while now < self.next_deadline:
+			time.sleep(self.next_deadline - now)
+			now = time.perf_counter()
+		lateness = now - self.next_deadline
+		self.lateness_sum += lateness
+		if lateness > self.lateness_max:
+			self.lateness_max = lateness
+		if self.first_event_time is None:
+			self.first_event_time = now
+		self.last_event_time = now
+		self.last_deadline = self.next_deadline
+		self.event_count += 1
+		return now
+
+	def advance(self, interval):
+		# Move the deadline on by interval seconds from the previous deadline.
+		self.next_deadline += interval
+
+	def report(self):
+		result = {
+			'events': self.event_count,
+			'elapsed': 0.0,
+			'scheduled': 0.0,
+			'rate': 0.0,
+			'target_rate': 0.0,
+			'lateness_mean': 0.0,
+			'lateness_max': self.lateness_max,
+			'drift': 0.0,
+		}
+		if self.event_count > 0:
+			result['lateness_mean'] = self.lateness_sum / self.event_count
+			result['elapsed'] = self.last_event_time - self.first_event_time
+			result['scheduled'] = self.last_deadline - self.first_event_time
+			result['drift'] = self.last_event_time - self.last_deadline
+		if result['elapsed'] > 0:
+			result['rate'] = (self.event_count - 1) / result['elapsed']
+		if result['scheduled'] > 0:
+			result['target_rate'] = (self.event_count - 1) / result['scheduled']
+		return result
+
+def FormatReport(report, name='frames'):
+	return (f"Sent {report['events']} {name} in {report['elapsed']:.3f} s, scheduled {report['scheduled']:.3f} s. "
+		f"Rate {report['rate']:.3f}/s, target {report['target_rate']:.3f}/s. "
+		f"Lateness mean {report['lateness_mean'] * 1e3:.3f} ms, max {report['lateness_max'] * 1e3:.3f} ms, final drift {report['drift'] * 1e3:.3f} ms.")
@@ -0,0 +1,74 @@
+# Bulk random payload generation for the frame generators.
+
+import random
+
+PAYLOAD_KINDS = ['printable', 'binary']
+
+# Printable ASCII, space to tilde.
+PRINTABLE_FIRST = 0x20
+PRINTABLE_COUNT = 95
+# Random bytes below this map evenly onto the printable range, the rest are
+# dropped so no character is more likely than another.
+_PRINTABLE_LIMIT = 2 * PRINTABLE_COUNT
+_PRINTABLE_TABLE = bytes(PRINTABLE_FIRST + value % PRINTABLE_COUNT if value < _PRINTABLE_LIMIT else 0 for value in range(256))
+_PRINTABLE_DROP = bytes(range(_PRINTABLE_LIMIT, 256))
+
+POOL_SIZE = 65536
+
+class PayloadGenerator:
+	# Produces random printable or binary payload bytes in bulk from its own
+	# random.Random, so a given seed always gives the same byte stream however
+	# the bytes are split into frames, and a receiver can regenerate it. Bytes
+	# are generated pool_size at a time and handed out in slices.
+
+	def __init__(self, seed=None, kind='printable', pool_size=POOL_SIZE):
+		if kind not in PAYLOAD_KINDS:
+			raise ValueError(f'Unknown payload kind {kind}')
+		self.rng = random.Random(seed)
+		self.kind = kind
+		self.pool_size = pool_size
+		self._pool = b''
+		self._index = 0
+
+	def _RandomBytes(self, count):
+		if count <= 0:
+			return b''
+		return self.rng.getrandbits(8 * count).to_bytes(count, 'little')
+
+	def _Generate(self, count):
+		# Returns at least count new bytes of the generator's kind.
+		if self.kind == 'binary':
+			return self._RandomBytes(count)
+		output = b''
+		while len(output) < count:
+			# About three quarters of random bytes are kept, ask for a little more.
+			raw = self._RandomBytes((count - len(output)) * 4 // 3 + 16)
+			output += raw.translate(_PRINTABLE_TABLE, _PRINTABLE_DROP)
+		return output
+
+	def take(self, count):
+		# Returns the next count payload bytes.
+		if self._index + count > len(self._pool):
+			# Always generate whole pools, so the stream doesn't depend on how it
+			# is split into takes.
+			pool = [self._pool[self._index:]]
+			available = len(pool[0])
+			while available < count:
+				pool.append(self._Generate(self.pool_size))
+				available += len(pool[-1])
+			self._pool = b''.join(pool)
+			self._index = 0
+		payload = self._pool[self._index:self._index + count]
+		self._index += count
+		return payload
+
+	def fill(self, lengths):
+		# Returns a list of payloads, one for each length, from a single bulk
+		# generation.
+		data = self.take(sum(lengths))
+		payloads = []
+		start = 0
+		for length in lengths:
+			payloads.append(data[start:start + length])
+			start += length
+		return payloads
@@ -0,0 +1,194 @@
+# pcap capture files for KISS frames, readable by Wireshark, and a reader for
+# pcap and pcapng captures.
+
+import struct
+import time
+
+# AX.25 frame without any KISS byte.
+LINKTYPE_AX25 = 3
+# AX.25 frame preceded by the one byte KISS type indicator.
+LINKTYPE_AX25_KISS = 202
+# Magic numbers for microsecond and nanosecond timestamp pcap files.
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+# pcapng block types.
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 1
+PCAPNG_SIMPLE_PACKET = 3
+PCAPNG_ENHANCED_PACKET = 6
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+SNAPLEN = 65535
+
+FILE_HEADER = struct.Struct('<IHHiIII')
+RECORD_HEADER = struct.Struct('<IIII')
+
+class PcapWriter:
+	# Writes frames to a nanosecond resolution pcap file. Records are buffered
+	# in memory and written out when buffer_size bytes are waiting or
+	# flush_interval seconds have passed. With rotate_bytes or rotate_seconds set
+	# the capture moves to a new numbered file when either limit is reached.
+
+	def __init__(self, file_name, link_type=LINKTYPE_AX25_KISS, rotate_bytes=0, rotate_seconds=0, flush_interval=1.0, buffer_size=65536):
+		self.file_name = file_name
+		self.link_type = link_type
+		self.rotate_bytes = rotate_bytes
+		self.rotate_seconds = rotate_seconds
+		self.flush_interval = flush_interval
+		self.buffer_size = buffer_size
+		self.frame_count = 0
+		self.file_index = 0
+		self._buffer = []
+		self._buffered_bytes = 0
+		self._file = None
+		self._Open()
+
+	def _CurrentName(self):
+		if self.rotate_bytes <= 0 and self.rotate_seconds <= 0:
+			return self.file_name
+		stem, dot, extension = self.file_name.rpartition('.')
+		if not dot:
+			stem, extension = self.file_name, 'pcap'
+		return f'{stem}-{self.file_index:04d}.{extension}'
+
+	def _Open(self):
+		self._file = open(self._CurrentName(), 'wb')
+		self._file.write(FILE_HEADER.pack(PCAP_MAGIC_NS, 2, 4, 0, 0, SNAPLEN, self.link_type))
+		self._file_bytes = FILE_HEADER.size
+		self._file_opened = time.monotonic()
+		self._last_flush = self._file_opened
+
+	def write(self, frame, timestamp_ns):
+		# timestamp_ns is wall clock time in nanoseconds since the epoch.
+		seconds, nanoseconds = divmod(timestamp_ns, 1000000000)
+		captured = frame[:SNAPLEN]
+		record = RECORD_HEADER.pack(seconds, nanoseconds, len(captured), len(frame)) + bytes(captured)
+		if self._Rotating(len(record)):
+			self.flush()
+			self._file.close()
+			self.file_index += 1
+			self._Open()
+		self._buffer.append(record)
+		self._buffered_bytes += len(record)
+		self._file_bytes += len(record)
+		self.frame_count += 1
+		if self._buffered_bytes >= self.buffer_size:
+			self.flush()
+		else:
+			self.poll()
+
+	def _Rotating(self, record_length):
+		if self._file_bytes <= FILE_HEADER.size:
+			return False
+		if self.rotate_bytes > 0 and self._file_bytes + record_length > self.rotate_bytes:
+			return True
+		if self.rotate_seconds > 0 and time.monotonic() - self._file_opened >= self.rotate_seconds:
+			return True
+		return False
+
+	def poll(self):
+		# Call periodically, writes out the buffer once flush_interval has passed.
+		if self._buffered_bytes > 0 and time.monotonic() - self._last_flush >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		if self._buffer:
+			self._file.write(b''.join(self._buffer))
+			self._buffer = []
+			self._buffered_bytes = 0
+		self._file.flush()
+		self._last_flush = time.monotonic()
+
+	def close(self):
+		if self._file is not None:
+			self.flush()
+			self._file.close()
+			self._file = None
+
+def IsCaptureFile(file_name):
+	# True when the file starts with a pcap or pcapng magic number.
+	with open(file_name, 'rb') as file:
+		magic = file.read(4)
+	if len(magic) < 4:
+		return False
+	for order in '<>':
+		if struct.unpack(order + 'I', magic)[0] in (PCAP_MAGIC, PCAP_MAGIC_NS, PCAPNG_SECTION_HEADER):
+			return True
+	return False
+
+def ReadCapture(file_name):
+	# Yields (timestamp_ns, link_type, frame) for each packet in a pcap or pcapng
+	# file, in file order. timestamp_ns is None for pcapng simple packets.
+	with open(file_name, 'rb') as file:
+		data = file.read()
+	if len(data) < 4:
+		raise ValueError(f'{file_name} is not a capture file')
+	if struct.unpack('<I', data[:4])[0] == PCAPNG_SECTION_HEADER:
+		yield from _ReadPcapng(data)
+		return
+	for order in '<>':
+		magic = struct.unpack(order + 'I', data[:4])[0]
+		if magic in (PCAP_MAGIC, PCAP_MAGIC_NS):
+			break
+	else:
+		raise ValueError(f'{file_name} is not a capture file')
+	if magic == PCAP_MAGIC_NS:
+		scale = 1
+	else:
+		scale = 1000
+	link_type = struct.unpack(order + 'I', data[20:24])[0] & 0xFFFF
+	record_header = struct.Struct(order + 'IIII')
+	offset = FILE_HEADER.size
+	while offset + record_header.size <= len(data):
+		seconds, fraction, captured, length = record_header.unpack_from(data, offset)
+		offset += record_header.size
+		yield seconds * 1000000000 + fraction * scale, link_type, data[offset:offset + captured]
+		offset += captured
+
+def _ReadPcapng(data):
+	order = '<'
+	interfaces = []
+	offset = 0
+	while offset + 12 <= len(data):
+		block_type = struct.unpack_from(order + 'I', data, offset)[0]
+		if block_type == PCAPNG_SECTION_HEADER:
+			# The byte order magic sets the order for the whole section.
+			if struct.unpack_from('<I', data, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+				order = '<'
+			else:
+				order = '>'
+			interfaces = []
+		block_length = struct.unpack_from(order + 'I', data, offset + 4)[0]
+		if block_length < 12:
+			raise ValueError('Malformed pcapng block')
+		body = data[offset + 8:offset + block_length - 4]
+		if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+			interfaces.append(_InterfaceDescription(body, order))
+		elif block_type == PCAPNG_ENHANCED_PACKET:
+			interface, high, low, captured, length = struct.unpack_from(order + 'IIIII', body)
+			link_type, units_per_second = interfaces[interface]
+			timestamp = (high << 32) | low
+			yield timestamp * 1000000000 // units_per_second, link_type, body[20:20 + captured]
+		elif block_type == PCAPNG_SIMPLE_PACKET:
+			length = struct.unpack_from(order + 'I', body)[0]
+			link_type, units_per_second = interfaces[0]
+			yield None, link_type, body[4:4 + min(length, len(body) - 4)]
+		offset += block_length
+
+def _InterfaceDescription(body, order):
+	# Returns (link type, timestamp units per second) for an interface.
+	link_type = struct.unpack_from(order + 'H', body)[0]
+	units_per_second = 1000000
+	offset = 8
+	while offset + 4 <= len(body):
+		code, length = struct.unpack_from(order + 'HH', body, offset)
+		if code == 0:
+			break
+		if code == 9 and length >= 1:
+			# if_tsresol, a power of ten, or of two when the top bit is set.
+			resolution = body[offset + 4]
+			if resolution & 0x80:
+				units_per_second = 1 << (resolution & 0x7F)
+			else:
+				units_per_second = 10 ** resolution
+		offset += 4 + ((length + 3) & ~3)
+	return link_type, units_per_second
@@ -0,0 +1,105 @@
+# Machine readable frame records for log pipelines, as JSON Lines or CSV.
+
+import csv
+import io
+import json
+import time
+import ax25
+import hexdump
+
+OUTPUT_FORMATS = ['jsonl', 'csv']
+PAYLOAD_FORMATS = ['hex', 'text']
+
+FIELDS = ['time', 'timestamp_ns', 'port', 'number', 'repeat', 'kiss_port', 'length', 'crc', 'destination', 'source', 'via', 'control', 'frame_type', 'control_name', 'ns', 'nr', 'poll_final', 'pid', 'pid_name', 'payload']
+
+def FrameRecord(kiss_frame, time_string, timestamp_ns, port, number, crc_val, payload_format='hex', repeat=0):
+	# Returns a dict of FIELDS for a received KISS frame. Header fields are None
+	# when the frame has no valid AX.25 header, the payload is then everything
+	# after the KISS type byte. Via is comma separated, '*' marks digipeaters that
+	# have repeated the frame. repeat counts earlier copies of the frame seen by
+	# the duplicate index.
+	header = ax25.DecodeAX25Header(kiss_frame)
+	record = {
+		'time': time_string,
+		'timestamp_ns': timestamp_ns,
+		'port': port,
+		'number': number,
+		'repeat': repeat,
+		'kiss_port': kiss_frame[0] >> 4,
+		'length': len(kiss_frame),
+		'crc': crc_val,
+		'destination': None,
+		'source': None,
+		'via': None,
+		'control': None,
+		'frame_type': None,
+		'control_name': None,
+		'ns': None,
+		'nr': None,
+		'poll_final': None,
+		'pid': None,
+		'pid_name': None,
+	}
+	payload_offset = 1
+	if header is not None:
+		record['destination'] = header.destination
+		record['source'] = header.source
+		record['via'] = ','.join([address + '*' if repeated else address for address, repeated in header.via])
+		record['control'] = header.control
+		record['frame_type'] = header.frame_type
+		record['control_name'] = header.control_name
+		record['ns'] = header.ns
+		record['nr'] = header.nr
+		record['poll_final'] = header.poll_final
+		record['pid'] = header.pid
+		record['pid_name'] = header.pid_name
+		payload_offset = header.payload_offset
+	payload = bytes(kiss_frame[payload_offset:])
+	if payload_format == 'text':
+		record['payload'] = hexdump.EscapeText(payload)
+	else:
+		record['payload'] = payload.hex()
+	return record
+
+class RecordWriter:
+	# Formats records into an in memory buffer and writes it to stream when
+	# buffer_size characters are waiting or flush_interval seconds have passed.
+
+	def __init__(self, stream, output_format='jsonl', flush_interval=1.0, buffer_size=65536):
+		if output_format not in OUTPUT_FORMATS:
+			raise ValueError(f'Unknown output format {output_format}')
+		self.stream = stream
+		self.output_format = output_format
+		self.flush_interval = flush_interval
+		self.buffer_size = buffer_size
+		self.record_count = 0
+		self._buffer = io.StringIO()
+		self._last_flush = time.monotonic()
+		if output_format == 'csv':
+			self._csv = csv.DictWriter(self._buffer, FIELDS, lineterminator='\n')
+			self._csv.writeheader()
+
+	def write(self, record):
+		if self.output_format == 'csv':
+			self._csv.writerow(record)
+		else:
+			self._buffer.write(json.dumps(record, separators=(',', ':')))
+			self._buffer.write('\n')
+		self.record_count += 1
+		if self._buffer.tell() >= self.buffer_size:
+			self.flush()
+		else:
+			self.poll()
+
+	def poll(self):
+		# Call periodically, writes out the buffer once flush_interval has passed.
+		if self._buffer.tell() > 0 and time.monotonic() - self._last_flush >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		if self._buffer.tell() > 0:
+			self.stream.write(self._buffer.getvalue())
+			self._buffer.seek(0)
+			self._buffer.truncate()
+		self.stream.flush()
+		self._last_flush = time.monotonic()
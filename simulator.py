@@ -0,0 +1,351 @@
+# Virtual TNCs on pseudo-terminals for load testing without hardware.
+#
+# Each VirtualTNC exposes a pty that speaks KISS like an N9600A. Data frames
+# from the host are queued, sent over a shared simulated channel and delivered
+# to every other TNC on the channel. The channel is half duplex: a TNC waits
+# for it to be clear, then keys up with p-persistence CSMA, waits TXDELAY,
+# sends every frame in its queue back to back and holds TXTAIL before
+# releasing it. Frame airtime comes from the air bit rate and modem framing.
+# Loss and corruption are applied separately for each receiver.
+
+import collections
+import os
+import random
+import select
+import time
+import ax25
+import kiss
+
+MODEM_MODES = ['ax25', 'il2p']
+
+# KISS commands, the low nibble of the type byte.
+CMD_DATA = 0x0
+CMD_TXDELAY = 0x1
+CMD_PERSIST = 0x2
+CMD_SLOT = 0x3
+CMD_TXTAIL = 0x4
+CMD_FULLDUPLEX = 0x5
+CMD_SETHW = 0x6
+CMD_GETVER = 0x8
+CMD_CONTROL = 0x9
+CMD_SETSERNO = 0xA
+CMD_GETALL = 0xB
+CMD_GETSERNO = 0xE
+# Sub commands of CMD_CONTROL, the first data byte.
+CONTROL_STOPTX = 0x00
+CONTROL_GETRSSI = 0xA7
+CONTROL_BEACON = 0xF0
+KISS_RETURN = 0xFF
+
+FIRMWARE_VERSION = 'tnc-sim 1.0'
+
+# Unsent bytes held for a host that isn't reading, beyond this frames are
+# dropped.
+HOST_BUFFER_LIMIT = 65536
+
+# Bit string of each byte, least significant bit first as HDLC sends it.
+_LSB_FIRST_BITS = [format(value, '08b')[::-1] for value in range(256)]
+
+def HDLCBits(frame):
+	# Bits on air for an AX.25 frame without its KISS type byte: the frame and
+	# FCS with bit stuffing, and one flag. A 0 is stuffed after every five 1s
+	# in a row, and the stuffed 0 ends the run, so each non-overlapping 11111
+	# costs one bit. The FCS is counted without stuffing.
+	bits = ''.join([_LSB_FIRST_BITS[value] for value in frame])
+	return len(bits) + bits.count('11111') + 16 + 8
+
+def IL2PBits(frame):
+	# Bits on air for an IL2P frame with trailing CRC: sync word, header with
+	# its parity, the payload in blocks of up to 239 bytes with 16 parity bytes
+	# each, and the 4 byte encoded CRC. A header with no digipeaters is carried
+	# in the IL2P header, otherwise the whole AX.25 frame is payload.
+	control_index = ax25.ControlIndex(frame, 0)
+	if control_index == 2 * ax25.ADDRESS_LENGTH:
+		payload_length = len(frame) - control_index - 1
+		if ax25.CONTROL_HAS_PID[frame[control_index]] and payload_length > 0:
+			payload_length -= 1
+	else:
+		payload_length = len(frame)
+	block_count = (payload_length + 238) // 239
+	return 8 * (3 + 15 + payload_length + 16 * block_count + 4)
+
+class Channel:
+	# The shared half duplex medium. Holds the TNC that has it keyed.
+
+	def __init__(self, baud=1200, mode='ax25', loss=0.0, corrupt=0.0, rng=None):
+		if mode not in MODEM_MODES:
+			raise ValueError(f'Unknown modem mode {mode}')
+		self.baud = baud
+		self.mode = mode
+		self.loss = loss
+		self.corrupt = corrupt
+		self.rng = rng or random.Random()
+		self.owner = None
+		self.tncs = []
+		self.busy_time = 0.0
+		self.start_time = time.monotonic()
+
+	def airtime(self, frame):
+		# Seconds to send frame, without the KISS type byte.
+		if self.baud <= 0:
+			return 0.0
+		if self.mode == 'il2p':
+			return IL2PBits(frame) / self.baud
+		return HDLCBits(frame) / self.baud
+
+	def deliver(self, sender, frame):
+		# Hands frame to every other TNC, dropping or corrupting it for each
+		# receiver on its own draw.
+		for tnc in self.tncs:
+			if tnc is sender:
+				continue
+			if self.loss > 0 and self.rng.random() < self.loss:
+				tnc.lost_count += 1
+				continue
+			copy = frame
+			if self.corrupt > 0 and self.rng.random() < self.corrupt:
+				copy = bytearray(frame)
+				bit = self.rng.randrange(8 * len(copy))
+				copy[bit >> 3] ^= 1 << (bit & 7)
+				tnc.corrupted_count += 1
+			tnc.receive(copy)
+
+class VirtualTNC:
+	# One simulated TNC. The host side is the slave device name, the simulator
+	# reads and writes the master end. queue_limit frames may wait to be sent,
+	# further frames from the host are dropped like a full TNC buffer.
+
+	def __init__(self, channel, index, queue_limit=32, txdelay=30, persist=63, slot=10, txtail=2):
+		import pty
+		import tty
+		self.channel = channel
+		self.index = index
+		self.queue_limit = queue_limit
+		# Timing parameters in 10 ms units as the KISS commands set them.
+		self.txdelay = txdelay
+		self.persist = persist
+		self.slot = slot
+		self.txtail = txtail
+		self.full_duplex = 0
+		self.hardware = 0
+		self.beacon_interval = 0
+		self.serial_number = f'SIM{index:05d}'.encode('ascii')
+		self.master, self._slave = pty.openpty()
+		tty.setraw(self.master)
+		tty.setraw(self._slave)
+		os.set_blocking(self.master, False)
+		# Keep the slave open so the master doesn't see hangups between host
+		# connections.
+		self.device = os.ttyname(self._slave)
+		self._deframer = kiss.KISSDeframer()
+		self._output = bytearray()
+		self.queue = collections.deque()
+		# idle, waiting for the channel, delay (TXDELAY), sending or tail.
+		self.state = 'idle'
+		self.event_time = None
+		self._current = None
+		self._key_time = 0.0
+		self.host_frame_count = 0
+		self.sent_count = 0
+		self.received_count = 0
+		self.lost_count = 0
+		self.corrupted_count = 0
+		self.overflow_count = 0
+		self.host_drop_count = 0
+		self.command_count = 0
+		self.max_queue = 0
+		channel.tncs.append(self)
+
+	def fileno(self):
+		return self.master
+
+	def wants_write(self):
+		return len(self._output) > 0
+
+	def read_host(self, now):
+		try:
+			data = os.read(self.master, 65536)
+		except (BlockingIOError, OSError):
+			return
+		for frame in self._deframer.feed(data):
+			self._HostFrame(frame, now)
+
+	def write_host(self):
+		try:
+			written = os.write(self.master, self._output)
+		except (BlockingIOError, OSError):
+			return
+		del self._output[:written]
+
+	def _Send(self, kiss_frame):
+		if len(self._output) + len(kiss_frame) > HOST_BUFFER_LIMIT:
+			self.host_drop_count += 1
+			return
+		self._output += kiss_frame
+		self.write_host()
+
+	def receive(self, frame):
+		self.received_count += 1
+		self._Send(kiss.EncodeKISSFrame(frame))
+
+	def _HostFrame(self, frame, now):
+		port = frame[0] >> 4
+		command = frame[0] & 0xF
+		data = frame[1:]
+		if frame[0] == KISS_RETURN:
+			return
+		if command == CMD_DATA:
+			self.host_frame_count += 1
+			if self.channel.baud <= 0:
+				# No airtime model, straight through.
+				self.sent_count += 1
+				self.channel.deliver(self, data)
+				return
+			if len(self.queue) >= self.queue_limit:
+				self.overflow_count += 1
+				return
+			self.queue.append(data)
+			self.max_queue = max(self.max_queue, len(self.queue))
+			if self.state == 'idle':
+				self.state = 'waiting'
+				self.event_time = now
+			return
+		self.command_count += 1
+		value = data[0] if len(data) > 0 else 0
+		if command == CMD_TXDELAY:
+			self.txdelay = value
+		elif command == CMD_PERSIST:
+			self.persist = value
+		elif command == CMD_SLOT:
+			self.slot = value
+		elif command == CMD_TXTAIL:
+			self.txtail = value
+		elif command == CMD_FULLDUPLEX:
+			self.full_duplex = value
+		elif command == CMD_SETHW:
+			self.hardware = value
+		elif command == CMD_GETVER:
+			self._Respond(port, command, FIRMWARE_VERSION)
+		elif command == CMD_SETSERNO:
+			self.serial_number = bytes(data[:8])
+		elif command == CMD_GETSERNO:
+			self._Respond(port, command, self.serial_number)
+		elif command == CMD_GETALL:
+			self._Respond(port, command, self.settings())
+		elif command == CMD_CONTROL:
+			if value == CONTROL_STOPTX:
+				# The frame on air is cut off and not delivered.
+				self.queue.clear()
+				self._current = None
+			elif value == CONTROL_BEACON and len(data) > 1:
+				self.beacon_interval = data[1]
+			elif value == CONTROL_GETRSSI:
+				self._Respond(port, command, 'RSSI 0')
+
+	def _Respond(self, port, command, text):
+		if isinstance(text, str):
+			text = text.encode('ascii')
+		self._Send(kiss.EncodeKISSFrame(text, port, command))
+
+	def settings(self):
+		serial_number = self.serial_number.decode('ascii', 'replace').strip('\x00')
+		return (f'{FIRMWARE_VERSION} SERNO:{serial_number} TXDELAY:{self.txdelay} PERSIST:{self.persist} SLOT:{self.slot} '
+			f'TXTAIL:{self.txtail} FULLDUP:{self.full_duplex} HW:{self.hardware} BCNINT:{self.beacon_interval} '
+			f'RX:{self.received_count} TX:{self.sent_count} QUEUE:{len(self.queue)}')
+
+	def service(self, now):
+		# Advances the transmit state machine through every step due by now.
+		# Steps are timed from the previous step's deadline, not from now, so
+		# late servicing doesn't stretch the airtime.
+		channel = self.channel
+		while self.event_time is not None and self.event_time <= now:
+			if self.state == 'waiting':
+				if channel.owner is not None:
+					# Carrier detected, sense again next slot.
+					self.event_time = now + max(self.slot, 1) / 100
+				elif channel.rng.random() * 256 < self.persist + 1:
+					channel.owner = self
+					self._key_time = self.event_time
+					self.state = 'delay'
+					self.event_time += self.txdelay / 100
+				else:
+					self.event_time = max(self.event_time, now) + max(self.slot, 1) / 100
+			elif self.state == 'delay' or self.state == 'sending':
+				if self._current is not None:
+					self.sent_count += 1
+					channel.deliver(self, self._current)
+					self._current = None
+				if self.queue:
+					self._current = self.queue.popleft()
+					self.state = 'sending'
+					self.event_time += channel.airtime(self._current)
+				else:
+					self.state = 'tail'
+					self.event_time += self.txtail / 100
+			elif self.state == 'tail':
+				channel.owner = None
+				channel.busy_time += self.event_time - self._key_time
+				if self.queue:
+					self.state = 'waiting'
+				else:
+					self.state = 'idle'
+					self.event_time = None
+
+	def report(self):
+		return {
+			'device': self.device,
+			'host_frames': self.host_frame_count,
+			'sent': self.sent_count,
+			'received': self.received_count,
+			'lost': self.lost_count,
+			'corrupted': self.corrupted_count,
+			'queue_overflow': self.overflow_count,
+			'host_dropped': self.host_drop_count,
+			'commands': self.command_count,
+			'max_queue': self.max_queue,
+			'queue': len(self.queue),
+		}
+
+class Simulator:
+	# Runs a channel and its TNCs from one select loop.
+
+	def __init__(self, count, baud=1200, mode='ax25', loss=0.0, corrupt=0.0, queue_limit=32, txdelay=30, persist=63, slot=10, txtail=2, seed=None):
+		self.channel = Channel(baud, mode, loss, corrupt, random.Random(seed))
+		self.tncs = [VirtualTNC(self.channel, index, queue_limit, txdelay, persist, slot, txtail) for index in range(count)]
+
+	def poll(self, max_wait=0.1):
+		# Waits up to max_wait seconds for host data or the next transmit step,
+		# then handles whatever is due.
+		now = time.monotonic()
+		deadline = now + max_wait
+		for tnc in self.tncs:
+			if tnc.event_time is not None and tnc.event_time < deadline:
+				deadline = tnc.event_time
+		writers = [tnc for tnc in self.tncs if tnc.wants_write()]
+		readable, writable, error = select.select(self.tncs, writers, [], max(0.0, deadline - now))
+		now = time.monotonic()
+		for tnc in writable:
+			tnc.write_host()
+		for tnc in readable:
+			tnc.read_host(now)
+		for tnc in self.tncs:
+			tnc.service(now)
+
+	def utilization(self):
+		# Fraction of the time since start that the channel has been keyed.
+		now = time.monotonic()
+		elapsed = now - self.channel.start_time
+		if elapsed <= 0:
+			return 0.0
+		busy_time = self.channel.busy_time
+		if self.channel.owner is not None:
+			busy_time += now - self.channel.owner._key_time
+		return busy_time / elapsed
+
+	def close(self):
+		for tnc in self.tncs:
+			for fd in (tnc.master, tnc._slave):
+				try:
+					os.close(fd)
+				except OSError:
+					pass
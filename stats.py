@@ -0,0 +1,130 @@
+# Streaming latency and throughput statistics with bounded memory.
+
+import math
+
+class LatencyHistogram:
+	# Log-linear bucketed histogram in the style of HdrHistogram. Values are
+	# integers (microseconds here). Values below 2**sub_bits are counted exactly,
+	# above that each power of two is split into 2**(sub_bits - 1) buckets, so
+	# any recorded value is reported within 1 part in 2**(sub_bits - 1). Memory
+	# grows with the log of the largest value, not with the number of values.
+
+	def __init__(self, sub_bits=8):
+		self.sub_bits = sub_bits
+		self.half_count = 1 << (sub_bits - 1)
+		self.counts = [0] * (1 << sub_bits)
+		self.total_count = 0
+
+	def _Index(self, value):
+		shift = value.bit_length() - self.sub_bits
+		if shift <= 0:
+			return value
+		return (shift + 1) * self.half_count + (value >> shift) - self.half_count
+
+	def _Range(self, index):
+		# Lowest and highest value counted in bucket index.
+		if index < 2 * self.half_count:
+			return index, index
+		shift = index // self.half_count - 1
+		low = (index % self.half_count + self.half_count) << shift
+		return low, low + (1 << shift) - 1
+
+	def record(self, value, count=1):
+		index = self._Index(max(0, int(value)))
+		if index >= len(self.counts):
+			self.counts.extend([0] * (index + 1 - len(self.counts)))
+		self.counts[index] += count
+		self.total_count += count
+
+	def percentile(self, percent):
+		# Returns the highest value equivalent to the requested percentile.
+		if self.total_count == 0:
+			return 0
+		target = max(1, math.ceil(self.total_count * percent / 100))
+		running = 0
+		for index, count in enumerate(self.counts):
+			running += count
+			if running >= target:
+				return self._Range(index)[1]
+		return self._Range(len(self.counts) - 1)[1]
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+class TransitStats:
+	# Accumulates per frame transit times (seconds) and payload sizes. Reports
+	# min, mean, percentiles, max, jitter, frames/s and goodput. frames/s runs
+	# from the first send, receive_rate only between the first and last receive
+	# so it leaves out the transit time of the first frame.
+
+	def __init__(self):
+		self.histogram = LatencyHistogram()
+		self.frame_count = 0
+		self.payload_bytes = 0
+		self.transit_sum = 0.0
+		self.transit_min = None
+		self.transit_max = None
+		# Interarrival jitter estimate from RFC 3550.
+		self.jitter = 0.0
+		self.last_transit = None
+		self.start_time = None
+		self.first_time = None
+		self.last_time = None
+
+	def start(self, now):
+		if self.start_time is None:
+			self.start_time = now
+
+	def record(self, transit_time, payload_length, receive_time):
+		self.histogram.record(round(transit_time * 1e6))
+		self.frame_count += 1
+		self.payload_bytes += payload_length
+		self.transit_sum += transit_time
+		if self.transit_min is None or transit_time < self.transit_min:
+			self.transit_min = transit_time
+		if self.transit_max is None or transit_time > self.transit_max:
+			self.transit_max = transit_time
+		if self.last_transit is not None:
+			self.jitter += (abs(transit_time - self.last_transit) - self.jitter) / 16
+		self.last_transit = transit_time
+		if self.first_time is None:
+			self.first_time = receive_time
+		self.last_time = receive_time
+
+	def summary(self, now=None):
+		if now is None:
+			now = self.last_time
+		elapsed = 0.0
+		if self.start_time is not None and now is not None:
+			elapsed = now - self.start_time
+		result = {
+			'frames': self.frame_count,
+			'payload_bytes': self.payload_bytes,
+			'elapsed': elapsed,
+			'frames_per_second': self.frame_count / elapsed if elapsed > 0 else 0.0,
+			'goodput': self.payload_bytes / elapsed if elapsed > 0 else 0.0,
+			'receive_rate': 0.0,
+			'transit_min': self.transit_min or 0.0,
+			'transit_mean': self.transit_sum / self.frame_count if self.frame_count > 0 else 0.0,
+			'transit_max': self.transit_max or 0.0,
+			'jitter': self.jitter,
+		}
+		if self.frame_count > 1 and self.last_time > self.first_time:
+			result['receive_rate'] = (self.frame_count - 1) / (self.last_time - self.first_time)
+		for percent in PERCENTILES:
+			# Bucket bounds can overshoot the extremes, clamp to what was seen.
+			value = self.histogram.percentile(percent) / 1e6
+			if self.frame_count > 0:
+				value = min(max(value, self.transit_min), self.transit_max)
+			result[f'transit_p{percent:g}'] = value
+		return result
+
+def FormatSummary(summary):
+	# One human readable line per group of figures, times in milliseconds.
+	lines = []
+	lines.append(f"Frames: {summary['frames']}, elapsed: {summary['elapsed']:.3f} s, {summary['frames_per_second']:.2f} frames/s, goodput: {summary['goodput']:.1f} payload bytes/s")
+	transit = [f"min {summary['transit_min'] * 1e3:.3f}", f"mean {summary['transit_mean'] * 1e3:.3f}"]
+	for percent in PERCENTILES:
+		transit.append(f"p{percent:g} {summary[f'transit_p{percent:g}'] * 1e3:.3f}")
+	transit.append(f"max {summary['transit_max'] * 1e3:.3f}")
+	lines.append(f"Transit ms: {', '.join(transit)}, jitter {summary['jitter'] * 1e3:.3f}")
+	return '\n'.join(lines)
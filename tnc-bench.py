@@ -0,0 +1,688 @@
+# tnc-bench
+# Python3
+# Microbenchmarks for the tnc-tools hot paths.
+# Exit codes
+# 1 Wrong python version
+# 2 Not enough command line arguments
+# 4 Unknown benchmark
+# 5 Unable to write results file
+
+import sys
+import os
+import random
+import string
+import timeit
+from timeit import default_timer as timer
+import io
+import datetime
+import crc
+import kiss
+import hexdump
+import ax25
+import filters
+import payloads
+import contextlib
+import json
+import platform
+import subprocess
+import threading
+import time
+import pacing
+
+FRAME_SIZES = [16, 64, 256, 1024]
+
+def LegacyCalcCRC16(packet):
+	# The original per-bit NumPy implementation, kept for comparison.
+	import numpy as np
+	fcsval = np.uint16(0xFFFF)
+	CRC_poly = np.uint16(0x8408)
+	one = np.uint16(1)
+	for byte in packet:
+		for i in range(8):
+			fcsbit = np.bitwise_and(fcsval, one)
+			fcsval = np.right_shift(fcsval, 1)
+			if np.bitwise_xor(fcsbit, np.bitwise_and(byte,one)) != 0:
+				fcsval = np.bitwise_xor(fcsval, CRC_poly)
+			byte = np.right_shift(byte, 1)
+	fcs_val = np.bitwise_and(np.bitwise_not(fcsval), 0xFFFF)
+	return(hex(fcs_val))
+
+def LegacyEncodeKISSFrame(kiss_frame):
+	# The original per-byte escaping loop, kept for comparison.
+	FESC = int(0xDB).to_bytes(1,'big')
+	FEND = int(0xC0).to_bytes(1,'big')
+	TFESC = int(0xDD).to_bytes(1,'big')
+	TFEND = int(0xDC).to_bytes(1,'big')
+	KISS_TYPE_ID = int(0).to_bytes(1,'big')
+	frame_index = 0
+	kiss_output_frame = bytearray()
+	while(frame_index < len(kiss_frame)):
+		kiss_byte = kiss_frame[frame_index]
+		if kiss_byte.to_bytes(1,'big') == FESC:
+			kiss_output_frame.extend(FESC)
+			kiss_output_frame.extend(TFESC)
+		elif kiss_byte.to_bytes(1, 'big') == FEND:
+			kiss_output_frame.extend(FESC)
+			kiss_output_frame.extend(TFEND)
+		else:
+			kiss_output_frame.extend(kiss_byte.to_bytes(1, 'big'))
+		frame_index += 1
+	return bytearray(FEND) + bytearray(KISS_TYPE_ID) + kiss_output_frame + bytearray(FEND)
+
+def LegacyDeframe(stream):
+	# The original per-byte receive state machine, kept for comparison.
+	FESC = 0xDB
+	FEND = 0xC0
+	TFESC = 0xDD
+	TFEND = 0xDC
+	kiss_state = "non-escaped"
+	kiss_frame = []
+	frames = []
+	for index in range(len(stream)):
+		input_data = stream[index:index + 1]
+		if kiss_state == "non-escaped":
+			if ord(input_data) == FESC:
+				kiss_state = "escaped"
+			elif ord(input_data) == FEND:
+				if len(kiss_frame) > 0:
+					frames.append(kiss_frame)
+				kiss_frame = []
+			else:
+				kiss_frame.append(ord(input_data))
+		elif kiss_state == "escaped":
+			if ord(input_data) == TFESC:
+				kiss_frame.append(FESC)
+				kiss_state = "non-escaped"
+			elif ord(input_data) == TFEND:
+				kiss_frame.append(FEND)
+				kiss_state = "non-escaped"
+	return frames
+
+def LegacyPrintFrame(frame, time, crc_val, count, file):
+	# The original kiss-listen per-byte print_frame, writing to file for comparison.
+	print("\r\n-- ", end='', file=file)
+	print(time, end=' ', file=file)
+	frame_len = len(frame)
+	print(f'crc: {crc_val}', end='', file=file)
+	print(" number: %d" % count, end=' ', file=file)
+	print("byte count: ", frame_len, end='\r\n', file=file)
+	frame_lines = (frame_len // 16)
+	if (frame_len % 16) > 0:
+		frame_lines += 1
+	frame_index = 0
+	for line in range(0, frame_lines):
+		for i in range(0, 16):
+			if frame_index < frame_len:
+				if frame[frame_index] < 0x20:
+					print('.', end='', file=file)
+				elif frame[frame_index] > 0x7E:
+					print('.', end='', file=file)
+				else:
+					print(chr(frame[frame_index]), end='', file=file)
+				frame_index += 1
+			else:
+				print(' ', end='', file=file)
+		print(' | ', end='', file=file)
+		frame_index = line * 16
+		for i in range(0, 16):
+			if frame_index < frame_len:
+				print("%2X" % frame[frame_index], end=' ', file=file)
+				frame_index += 1
+		print('\r\n', end='', flush=True, file=file)
+
+def LegacyPrintAX25Header(frame, delimiter):
+	# The original kiss-listen decode-and-print loop, kept for comparison.
+	count = len(frame)
+	index = 0
+	if (count > 15):
+		valid_header = 1
+		address_extension_bit = 0
+		index = 1
+		subfield_character_index = 0
+		subfield_index = 0
+		# Print address information
+		while address_extension_bit == 0:
+			working_character = int(frame[index])
+			if (working_character & 0b1) == 1:
+				address_extension_bit = 1
+			working_character = working_character >> 1
+			subfield_character_index = subfield_character_index + 1
+			if (subfield_character_index == 1):
+				if (subfield_index == 0):
+					print("To:", end='')
+				elif (subfield_index == 1):
+					print(delimiter, end='')
+					print("From:", end='')
+				else:
+					print(delimiter, end='')
+					print("Via:", end='')
+			if subfield_character_index < 7:
+				# This is a callsign character
+				if (working_character != 0) and (working_character != 0x20):
+					print(chr(working_character), end='')
+			elif subfield_character_index == 7:
+				# This is the SSID characters
+				# Get bits
+				print('-', end='')
+				print(working_character & 0b1111, end='')
+				if (working_character & 0b10000000):
+					# C or H bit is set
+					print('*', end=' ')
+				# This field is complete
+				subfield_character_index = 0
+				subfield_index = subfield_index + 1
+			index = index + 1
+			if index > count:
+				address_extension_bit = 1
+		# Control and PID fields
+		working_character = frame[index]
+		print(delimiter, end='')
+		print("Control: ", end='')
+		print(f'{hex(working_character)} ', end='')
+		poll_final_bit = (working_character & 0x10) >> 4
+		# determine what type of frame this is
+		if (working_character & 1) == 1:
+			# either a Supervisory or Unnumbered frame
+			frame_type = working_character & 3
+		else:
+			# Information frame
+			frame_type = 0
+			ax25_ns = (working_character >> 1) & 7
+			ax25_nr = (working_character >> 5) & 7
+
+		if frame_type == 1:
+			# Supervisory frame
+			ax25_nr = (working_character >> 5) & 7
+
+		if frame_type == 3:
+			# Unnumbered frame, determine what type
+			ax25_u_control_field_type = working_character & 0xEF
+		else:
+			ax25_u_control_field_type = 0
+
+		if (ax25_u_control_field_type == 0x6F):
+			print("SABME", end='')
+		elif (ax25_u_control_field_type == 0x2F):
+			print("SABM", end='')
+		elif (ax25_u_control_field_type == 0x43):
+			print("DISC", end='')
+		elif (ax25_u_control_field_type == 0x0F):
+			print("DM", end='')
+		elif (ax25_u_control_field_type == 0x63):
+			print("UA", end='')
+		elif (ax25_u_control_field_type == 0x87):
+			print("FRMR", end='')
+		elif (ax25_u_control_field_type == 0x03):
+			print("UI", end='')
+		elif (ax25_u_control_field_type == 0xAF):
+			print("XID", end='')
+		elif (ax25_u_control_field_type == 0xE3):
+			print("TEST", end='')
+
+		if (frame_type == 0) or (ax25_u_control_field_type == 3):
+			# This is an Information frame, or an Unnumbered Information frame, so
+			# there is a PID byte.
+			index = index + 1
+			working_character = frame[index]
+			print(delimiter, end='')
+			print("PID: ", end='')
+			print(f'{hex(working_character)} ', end='')
+			if (working_character == 1):
+				print("ISO 8208", end='')
+			if (working_character == 6):
+				print("Compressed TCP/IP", end='')
+			if (working_character == 7):
+				print("Uncompressed TCP/IP", end='')
+			if (working_character == 8):
+				print("Segmentation Fragment", end='')
+			if (working_character == 0xC3):
+				print("TEXNET", end='')
+			if (working_character == 0xC4):
+				print("Link Quality Protocol", end='')
+			if (working_character == 0xCA):
+				print("Appletalk", end='')
+			if (working_character == 0xCC):
+				print("ARPA Internet Protocol", end='')
+			if (working_character == 0xCD):
+				print("ARPA Address Resolution", end='')
+			if (working_character == 0xCF):
+				print("TheNET (NET/ROM)", end='')
+			if (working_character == 0xF0):
+				print("No Layer 3", end='')
+			if (working_character == 0xFF):
+				print("Escape", end='')
+
+		index = index + 1
+
+		# return the index of the start of payload data
+		print(" ")
+	return index
+
+
+def LegacyStringCallsignToArray(input_string, error_string, error_code):
+	# The original per-character callsign parser, kept for comparison.
+	output = [0x20, 0x20, 0x20, 0x20, 0x20, 0x20, 0]
+	callsign_length = 0
+	ssid_digits = 0
+	ssid = [0,0]
+	currently_reading = 'callsign'
+	input_string = input_string.upper()
+	input_string = bytes(input_string, 'UTF-8')
+	for character in input_string:
+		if currently_reading == 'callsign':
+			if character == bytes('-', 'UTF-8')[0]:
+				currently_reading = 'ssid'
+			else:
+				output[callsign_length] = int(character)
+				callsign_length += 1
+				if callsign_length == 6:
+					currently_reading = 'hyphen'
+				# print(output)
+		elif currently_reading == 'hyphen':
+			if character != bytes('-', 'UTF-8')[0]:
+				print(error_string)
+				sys.exit(error_code)
+			currently_reading = 'ssid'
+		elif currently_reading == 'ssid':
+			ssid[ssid_digits] = character - bytes('0', 'UTF-8')[0]
+			ssid_digits += 1
+			# print(ssid)
+	if ssid_digits == 1:
+		ssid = ssid[0]
+	elif ssid_digits == 2:
+		ssid = ssid[0] * 10 + ssid[1]
+	else:
+		ssid = 0
+	if ssid > 16:
+		ssid = 16
+	if ssid < 0:
+		ssid = 0
+	output[6] = ssid
+	return output
+def LegacyGenerateRandomCallsign():
+	this = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+	this += '-'
+	this += ''.join(random.choices(string.digits, k=1))
+	return this
+
+def LegacyAddressPair():
+	# Random address pair the way kiss-loop built one per frame.
+	source_callsign = LegacyStringCallsignToArray(LegacyGenerateRandomCallsign(), '', 4)
+	dest_callsign = LegacyStringCallsignToArray(LegacyGenerateRandomCallsign(), '', 5)
+	frame = bytearray()
+	for j in range(6):
+		frame.extend((dest_callsign[j]<<1).to_bytes(1,'big'))
+	frame.extend((((dest_callsign[6] & 0xF)<<1) | 0xE0).to_bytes(1,'big'))
+	for k in range(6):
+		frame.extend((source_callsign[k]<<1).to_bytes(1,'big'))
+	frame.extend((((source_callsign[6] & 0xF) << 1) | 0x61).to_bytes(1,'big'))
+	return frame
+
+# Rows measured by the running benchmark, collected for the JSON results file.
+benchmark_rows = []
+
+def Record(**values):
+	benchmark_rows.append(values)
+
+def Rate(function, min_time=0.2):
+	# Returns calls per second, repeating until at least min_time has elapsed.
+	timer = timeit.Timer(function)
+	number, elapsed = timer.autorange()
+	while elapsed < min_time:
+		number *= 2
+		elapsed = timer.timeit(number)
+	return number / elapsed
+
+def BenchCRC():
+	print('CRC-16/X.25, frames per second')
+	print(f'{"bytes":>6} {"CalcCRC16Int":>14} {"table":>12} {"legacy":>10}')
+	for size in FRAME_SIZES:
+		frame = os.urandom(size)
+		assert crc.CalcCRC16Int(frame) == crc.CalcCRC16Table(frame)
+		fast_rate = Rate(lambda: crc.CalcCRC16Int(frame))
+		table_rate = Rate(lambda: crc.CalcCRC16Table(frame))
+		try:
+			legacy_value = Rate(lambda: LegacyCalcCRC16(frame), 0.05)
+			legacy_rate = f'{legacy_value:10.0f}'
+		except ImportError:
+			legacy_value = None
+			legacy_rate = f'{"n/a":>10}'
+		Record(bytes=size, crc16_int=fast_rate, table=table_rate, legacy=legacy_value)
+		print(f'{size:6d} {fast_rate:14.0f} {table_rate:12.0f} {legacy_rate}')
+
+def RandomFrames(count, min_len=16, max_len=256):
+	data = os.urandom(count * max_len)
+	frames = []
+	for i in range(count):
+		start = i * max_len
+		frames.append(data[start:start + random.randint(min_len, max_len)])
+	return frames
+
+def BenchCRCBatch():
+	print('CRC-16/X.25 batch, 16 to 256 byte frames, seconds')
+	print(f'{"frames":>8} {"CalcCRC16":>10} {"CalcCRC16Int":>13} {"batch 2-D":>10}')
+	# Import NumPy and build the batch tables outside the timed region.
+	crc.CalcCRC16Batch(*crc.PadFrames(RandomFrames(16)))
+	for count in [10000, 100000, 1000000]:
+		frames = RandomFrames(count)
+		start = timer()
+		hex_result = [crc.CalcCRC16(frame) for frame in frames]
+		hex_time = timer() - start
+		start = timer()
+		int_result = [crc.CalcCRC16Int(frame) for frame in frames]
+		int_time = timer() - start
+		padded, lengths = crc.PadFrames(frames)
+		start = timer()
+		array_result = crc.CalcCRC16Batch(padded, lengths)
+		array_time = timer() - start
+		assert int_result == array_result.tolist()
+		assert hex_result[0] == hex(int_result[0])
+		Record(frames=count, crc16=hex_time, crc16_int=int_time, batch_2d=array_time)
+		print(f'{count:8d} {hex_time:10.3f} {int_time:13.3f} {array_time:10.3f}')
+
+def BenchKISSEncode():
+	print('KISS encode, MB/s of unescaped frame data')
+	print(f'{"bytes":>6} {"payload":>8} {"EncodeKISSFrame":>16} {"legacy":>8}')
+	for size in FRAME_SIZES:
+		payloads = [('random', os.urandom(size)), ('worst', bytes(random.choice([0xC0, 0xDB]) for i in range(size)))]
+		for name, frame in payloads:
+			assert kiss.EncodeKISSFrame(frame) == LegacyEncodeKISSFrame(frame)
+			fast_rate = Rate(lambda: kiss.EncodeKISSFrame(frame)) * size / 1e6
+			legacy_rate = Rate(lambda: LegacyEncodeKISSFrame(frame), 0.05) * size / 1e6
+			Record(bytes=size, payload=name, encode=fast_rate, legacy=legacy_rate)
+			print(f'{size:6d} {name:>8} {fast_rate:16.1f} {legacy_rate:8.2f}')
+
+def DeframeChunks(stream, chunk_size):
+	deframer = kiss.KISSDeframer()
+	frames = []
+	for start in range(0, len(stream), chunk_size):
+		frames.extend(deframer.feed(stream[start:start + chunk_size]))
+	return frames
+
+def BenchKISSDeframe():
+	print('KISS deframe, MB/s of escaped stream, 100 frames per stream')
+	print(f'{"bytes":>6} {"payload":>8} {"1 byte":>8} {"64 byte":>8} {"4 KB":>8} {"legacy":>8}')
+	for size in FRAME_SIZES:
+		payloads = [('random', os.urandom(size)), ('worst', bytes(random.choice([0xC0, 0xDB]) for i in range(size)))]
+		for name, frame in payloads:
+			stream = bytes(kiss.EncodeKISSFrame(frame)) * 100
+			assert DeframeChunks(stream, 64) == [b'\x00' + frame] * 100
+			assert [bytes(f) for f in LegacyDeframe(stream)] == [b'\x00' + frame] * 100
+			rates = []
+			for chunk_size in [1, 64, 4096]:
+				rates.append(Rate(lambda: DeframeChunks(stream, chunk_size), 0.05) * len(stream) / 1e6)
+			rates.append(Rate(lambda: LegacyDeframe(stream), 0.05) * len(stream) / 1e6)
+			Record(bytes=size, payload=name, chunk_1=rates[0], chunk_64=rates[1], chunk_4096=rates[2], legacy=rates[3])
+			print(f'{size:6d} {name:>8} ' + ' '.join(f'{rate:8.2f}' for rate in rates))
+
+def LegacyRender(frame, timestamp_ns, count):
+	# Original timestamp formatting and print_frame, returning the output.
+	output = io.StringIO()
+	t = datetime.datetime.fromtimestamp(timestamp_ns / 1e9).strftime('%Y-%m-%d %H:%M:%S.%f')
+	LegacyPrintFrame(frame, t[:-3], '0x0', count, output)
+	return output.getvalue()
+
+def FastRender(frame, timestamp_cache, timestamp_ns, count):
+	t = timestamp_cache.format(timestamp_ns)
+	return f'\r\n-- {t} crc: 0x0 number: {count} byte count:  {len(frame)}\r\n' + hexdump.DumpLines(frame)
+
+def BenchHexdump():
+	print('Frame hex dump rendering, frames per second')
+	print(f'{"bytes":>6} {"DumpLines":>10} {"legacy":>8}')
+	# Whole milliseconds, so both timestamp paths agree.
+	timestamp_ns = 1700000000123000000
+	timestamp_cache = hexdump.TimestampCache()
+	for size in range(0, 300):
+		frame = os.urandom(size)
+		assert FastRender(frame, timestamp_cache, timestamp_ns, size) == LegacyRender(frame, timestamp_ns, size)
+	for size in FRAME_SIZES:
+		frame = os.urandom(size)
+		fast_rate = Rate(lambda: FastRender(frame, timestamp_cache, timestamp_ns, 1))
+		legacy_rate = Rate(lambda: LegacyRender(frame, timestamp_ns, 1), 0.05)
+		Record(bytes=size, dump_lines=fast_rate, legacy=legacy_rate)
+		print(f'{size:6d} {fast_rate:10.0f} {legacy_rate:8.0f}')
+
+def RandomHeaderFrames(count):
+	# KISS frames with random addresses, up to 2 digipeaters with the H bit
+	# clear, and a mix of control and PID values.
+	controls = [0x03, 0x13, 0x3F, 0x2F, 0x43, 0x63, 0xE3, 0x01, 0x21, 0x00, 0x54, 0x9A]
+	pids = [0xF0, 0xCC, 0xCF, 0x08, 0x42]
+	frames = []
+	for i in range(count):
+		address_count = 2 + random.randint(0, 2)
+		frame = bytearray(b'\x00')
+		for j in range(address_count):
+			callsign = random.choice([b'KK4HEJ', b'KA2DEW', b'WIDE1 ', b'N0CALL', b'AB1   '])
+			frame.extend(value << 1 for value in callsign)
+			frame.append(0x60 | (random.randint(0, 15) << 1) | (j == address_count - 1))
+		frame.append(random.choice(controls))
+		frame.append(random.choice(pids))
+		frame.extend(os.urandom(random.randint(0, 64)))
+		frames.append(bytes(frame))
+	return frames
+
+def LegacyDecode(frames):
+	with contextlib.redirect_stdout(io.StringIO()) as output:
+		for frame in frames:
+			LegacyPrintAX25Header(frame, ', ')
+	return output.getvalue()
+
+def FormatHeaders(frames):
+	lines = []
+	for frame in frames:
+		header = ax25.DecodeAX25Header(frame)
+		if header is not None:
+			lines.append(ax25.FormatAX25Header(header) + ' \n')
+	return ''.join(lines)
+
+def BenchAX25Decode():
+	print('AX.25 header decode, frames per second, 1000 frames')
+	print(f'{"decode":>10} {"format":>10} {"legacy":>10}')
+	frames = RandomHeaderFrames(1000)
+	assert FormatHeaders(frames) == LegacyDecode(frames)
+	decode_rate = Rate(lambda: [ax25.DecodeAX25Header(frame) for frame in frames]) * len(frames)
+	format_rate = Rate(lambda: FormatHeaders(frames)) * len(frames)
+	legacy_rate = Rate(lambda: LegacyDecode(frames)) * len(frames)
+	Record(decode=decode_rate, format=format_rate, legacy=legacy_rate)
+	print(f'{decode_rate:10.0f} {format_rate:10.0f} {legacy_rate:10.0f}')
+
+FILTER_EXPRESSIONS = ['src=KK4HEJ-*', 'src=KK4HEJ-* and pid=0xF0 and len>64', 'via=WIDE1-* or type=SABM']
+
+def BenchFilter():
+	print('Filter expressions against full decode, frames per second, 1000 frames')
+	print(f'{"expression":>40} {"matched":>8} {"filter":>10} {"decode":>10}')
+	frames = RandomHeaderFrames(1000)
+	decode_rate = Rate(lambda: [ax25.DecodeAX25Header(frame) for frame in frames]) * len(frames)
+	for expression in FILTER_EXPRESSIONS:
+		predicate = filters.CompileFilter(expression)
+		matched = sum(1 for frame in frames if predicate(frame))
+		filter_rate = Rate(lambda: [predicate(frame) for frame in frames]) * len(frames)
+		Record(expression=expression, matched=matched, filter=filter_rate, decode=decode_rate)
+		print(f'{expression:>40} {matched:8d} {filter_rate:10.0f} {decode_rate:10.0f}')
+
+def BenchAddress():
+	print('AX.25 address fields, per second')
+	print(f'{"":>22} {"new":>10} {"legacy":>10}')
+	legacy_source = LegacyStringCallsignToArray('KK4HEJ-4', '', 4)
+	legacy_field = bytes(character << 1 for character in legacy_source[:6]) + bytes([((legacy_source[6] & 0xF) << 1) | ax25.SOURCE_FLAGS])
+	assert ax25.EncodeAddress('KK4HEJ-4', ax25.SOURCE_FLAGS) == legacy_field
+	encode_rate = Rate(lambda: ax25.EncodeAddress('KK4HEJ-4', ax25.SOURCE_FLAGS))
+	legacy_rate = Rate(lambda: LegacyStringCallsignToArray('KK4HEJ-4', '', 4))
+	Record(case='same callsign', new=encode_rate, legacy=legacy_rate)
+	print(f'{"same callsign":>22} {encode_rate:10.0f} {legacy_rate:10.0f}')
+	bulk_rate = Rate(lambda: ax25.RandomAddressPairs(1024)) * 1024
+	legacy_rate = Rate(LegacyAddressPair)
+	Record(case='random address pairs', new=bulk_rate, legacy=legacy_rate)
+	print(f'{"random address pairs":>22} {bulk_rate:10.0f} {legacy_rate:10.0f}')
+
+def LegacyPayload(length):
+	# The original per-byte padding loop from kiss-ax25-ui-batch.
+	payload = bytearray()
+	for j in range(0, length):
+		rand = random.randint(32,126)
+		payload.extend(bytearray(rand.to_bytes(1,'big')))
+	return payload
+
+def BenchPayload():
+	print('Random payload generation, MB/s')
+	print(f'{"bytes":>6} {"printable":>10} {"binary":>8} {"fill x100":>10} {"legacy":>8}')
+	printable = payloads.PayloadGenerator(123)
+	binary = payloads.PayloadGenerator(123, 'binary')
+	for size in FRAME_SIZES:
+		payload = printable.take(size)
+		assert len(payload) == size and min(payload) >= 0x20 and max(payload) <= 0x7E
+		printable_rate = Rate(lambda: printable.take(size)) * size / 1e6
+		binary_rate = Rate(lambda: binary.take(size)) * size / 1e6
+		fill_rate = Rate(lambda: printable.fill([size] * 100)) * size * 100 / 1e6
+		legacy_rate = Rate(lambda: LegacyPayload(size), 0.05) * size / 1e6
+		Record(bytes=size, printable=printable_rate, binary=binary_rate, fill=fill_rate, legacy=legacy_rate)
+		print(f'{size:6d} {printable_rate:10.1f} {binary_rate:8.1f} {fill_rate:10.1f} {legacy_rate:8.2f}')
+
+# (simulated serial rate in bits/s, 0 for unpaced, frame count) for the
+# listener runs, 10 bits per byte as on a serial line.
+LISTENER_RATES = [(9600, 40), (115200, 200), (0, 1000)]
+LISTENER_MODES = [('hexdump', []), ('nohex', ['nohex']), ('jsonl', ['format=jsonl'])]
+LISTENER_TIMEOUT = 30
+
+def OpenPty():
+	# Returns (master fd, slave device name) for a raw mode pseudo-terminal pair.
+	import pty
+	import tty
+	master, slave = pty.openpty()
+	tty.setraw(master)
+	tty.setraw(slave)
+	return master, slave, os.ttyname(slave)
+
+def CountListenerFrames(stream, mode, counts):
+	# Counts frames in the listener output, appending the time of each one.
+	for line in stream:
+		if mode == 'jsonl':
+			frame_line = line.startswith(b'{')
+		else:
+			frame_line = line.startswith(b'-- ') or line.startswith(b'******* ')
+		if frame_line:
+			counts.append(timer())
+
+def ListenerRun(stream, frame_count, baud, mode, options):
+	# Feeds stream to kiss-listen.py through a pty, paced to baud, and returns
+	# (frames shown, seconds from first byte to last frame shown, seconds from
+	# last byte to last frame shown).
+	master, slave, device = OpenPty()
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kiss-listen.py')
+	listener = subprocess.Popen([sys.executable, script, device, '57600'] + options, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+	try:
+		# Wait for the port to open before sending.
+		while not listener.stdout.readline().startswith(b'Opened port'):
+			if listener.poll() is not None:
+				raise RuntimeError('kiss-listen.py exited before opening the port')
+		counts = []
+		reader = threading.Thread(target=CountListenerFrames, args=(listener.stdout, mode, counts), daemon=True)
+		reader.start()
+		frame_length = len(stream) // frame_count
+		pacer = pacing.DeadlinePacer()
+		start = timer()
+		for index in range(frame_count):
+			pacer.wait()
+			os.write(master, stream[index * frame_length:(index + 1) * frame_length])
+			if baud > 0:
+				pacer.advance(frame_length * 10 / baud)
+		written = timer()
+		deadline = written + LISTENER_TIMEOUT
+		while len(counts) < frame_count and timer() < deadline:
+			time.sleep(0.01)
+		if len(counts) == 0:
+			return 0, 0.0, 0.0
+		return len(counts), counts[-1] - start, counts[-1] - written
+	finally:
+		listener.terminate()
+		listener.wait()
+		os.close(master)
+		os.close(slave)
+
+def BenchListener():
+	print('kiss-listen.py end to end over a pty, 100 byte UI frames')
+	try:
+		import pty
+	except ImportError:
+		print('Needs pseudo-terminals, skipped on this platform.')
+		return
+	print(f'{"baud":>7} {"mode":>8} {"frames":>7} {"shown":>6} {"offered/s":>10} {"shown/s":>9} {"lag ms":>8}')
+	header = ax25.EncodeAddress('BENCH', ax25.DESTINATION_FLAGS) + ax25.EncodeAddress('KK4HEJ-4', ax25.SOURCE_FLAGS) + b'\x03\xf0'
+	frame = bytes(kiss.EncodeKISSFrame(header + b'benchmark '.ljust(100 - len(header), b'x')))
+	for baud, frame_count in LISTENER_RATES:
+		stream = frame * frame_count
+		for mode, options in LISTENER_MODES:
+			shown, elapsed, lag = ListenerRun(stream, frame_count, baud, mode, options)
+			if baud > 0:
+				offered = baud / 10 / len(frame)
+			else:
+				offered = None
+			shown_rate = shown / elapsed if elapsed > 0 else 0.0
+			Record(baud=baud, mode=mode, frames=frame_count, shown=shown, offered_rate=offered, shown_rate=shown_rate, lag=lag)
+			offered_text = f'{offered:10.1f}' if offered is not None else f'{"max":>10}'
+			print(f'{baud:7d} {mode:>8} {frame_count:7d} {shown:6d} {offered_text} {shown_rate:9.1f} {lag * 1e3:8.1f}')
+
+BENCHMARKS = {
+	'crc': BenchCRC,
+	'crc-batch': BenchCRCBatch,
+	'kiss-encode': BenchKISSEncode,
+	'kiss-deframe': BenchKISSDeframe,
+	'hexdump': BenchHexdump,
+	'ax25-decode': BenchAX25Decode,
+	'filter': BenchFilter,
+	'address': BenchAddress,
+	'payload': BenchPayload,
+	'listener': BenchListener,
+}
+
+if sys.version_info < (3, 0):
+	print("Python version should be 3.x, exiting")
+	sys.exit(1)
+
+# Optional file to write the results to as JSON.
+json_file_name = None
+arguments = []
+for arg in sys.argv[1:]:
+	if arg.startswith('json='):
+		json_file_name = arg[5:]
+	else:
+		arguments.append(arg)
+
+if len(arguments) < 1:
+	print('Not enough arguments. Usage prototype below.\r\npython3 tnc-bench.py <benchmark | all> <optional json=file>')
+	print(f'Available benchmarks: {" ".join(BENCHMARKS)}')
+	sys.exit(2)
+
+random.seed(123)
+
+if arguments[0] == 'all':
+	selected = list(BENCHMARKS)
+else:
+	selected = arguments
+
+for name in selected:
+	if name not in BENCHMARKS:
+		print(f'Unknown benchmark: {name}')
+		sys.exit(4)
+
+results = {
+	'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+	'python': platform.python_version(),
+	'platform': platform.platform(),
+	'machine': platform.machine(),
+	'benchmarks': {},
+}
+for name in selected:
+	benchmark_rows = []
+	BENCHMARKS[name]()
+	results['benchmarks'][name] = benchmark_rows
+	print('')
+
+if json_file_name is not None:
+	try:
+		with open(json_file_name, 'w') as json_file:
+			json.dump(results, json_file, indent=1)
+	except:
+		print(f'Unable to write results file {json_file_name}.')
+		sys.exit(5)
+	print(f'Results written to {json_file_name}')
@@ -0,0 +1,141 @@
+# tnc-sim
+# Python3
+# Simulate N9600A TNCs on pseudo-terminals sharing one radio channel.
+# Exit codes
+# 1 Wrong python version
+# 2 Not enough command line arguments
+# 3 Invalid TNC count
+# 4 Invalid option
+# 5 Unable to create pseudo-terminals
+
+import sys
+import time
+import json
+import simulator
+
+def ParseByte(text):
+	value = int(text)
+	if value < 0 or value > 255:
+		raise ValueError
+	return value
+
+def ParsePercent(text):
+	value = float(text)
+	if value < 0 or value > 100:
+		raise ValueError
+	return value / 100
+
+def PrintReport(tnc_simulator, elapsed):
+	print(f'{elapsed:.1f} s, channel busy {100 * tnc_simulator.utilization():.1f}%')
+	for tnc in tnc_simulator.tncs:
+		report = tnc.report()
+		print(f'TNC {tnc.index} {report["device"]}: from host {report["host_frames"]}, sent {report["sent"]}, received {report["received"]}, lost {report["lost"]}, corrupted {report["corrupted"]}, queue overflow {report["queue_overflow"]}, host dropped {report["host_dropped"]}, max queue {report["max_queue"]}, commands {report["commands"]}')
+
+if sys.version_info < (3, 0):
+	print("Python version should be 3.x, exiting")
+	sys.exit(1)
+
+if len(sys.argv) < 2:
+	print('Not enough arguments. Usage prototype below.\r\npython3 tnc-sim.py <tnc count> <optional baud=bits/s> <optional mode=ax25|il2p> <optional queue=frames> <optional txdelay=n> <optional txtail=n> <optional persist=n> <optional slot=n> <optional loss=percent> <optional corrupt=percent> <optional seed=n> <optional report=seconds> <optional json=file>')
+	sys.exit(2)
+
+try:
+	tnc_count = int(sys.argv[1])
+	if tnc_count < 1 or tnc_count > 16:
+		raise ValueError
+except ValueError:
+	print('Invalid TNC count, must be 1 to 16.')
+	sys.exit(3)
+
+# Air bit rate, 0 passes frames straight through with no airtime.
+baud = 1200
+modem_mode = 'ax25'
+queue_limit = 32
+# TXDELAY, TXTAIL and slot time in 10 ms units, as the KISS commands set them.
+txdelay = 30
+txtail = 2
+persist = 63
+slot = 10
+loss = 0.0
+corrupt = 0.0
+random_seed = None
+# Seconds between status reports, 0 reports only at exit.
+report_interval = 0.0
+json_file_name = None
+
+for option in sys.argv[2:]:
+	try:
+		if option.startswith('baud='):
+			baud = int(option[5:])
+			if baud < 0:
+				raise ValueError
+		elif option.startswith('mode='):
+			modem_mode = option[5:].lower()
+			if modem_mode not in simulator.MODEM_MODES:
+				raise ValueError
+		elif option.startswith('queue='):
+			queue_limit = int(option[6:])
+			if queue_limit < 1:
+				raise ValueError
+		elif option.startswith('txdelay='):
+			txdelay = ParseByte(option[8:])
+		elif option.startswith('txtail='):
+			txtail = ParseByte(option[7:])
+		elif option.startswith('persist='):
+			persist = ParseByte(option[8:])
+		elif option.startswith('slot='):
+			slot = ParseByte(option[5:])
+		elif option.startswith('loss='):
+			loss = ParsePercent(option[5:])
+		elif option.startswith('corrupt='):
+			corrupt = ParsePercent(option[8:])
+		elif option.startswith('seed='):
+			random_seed = int(option[5:])
+		elif option.startswith('report='):
+			report_interval = float(option[7:])
+			if report_interval < 0:
+				raise ValueError
+		elif option.startswith('json='):
+			json_file_name = option[5:]
+		else:
+			raise ValueError
+	except ValueError:
+		print(f'Invalid option {option}.')
+		sys.exit(4)
+
+try:
+	tnc_simulator = simulator.Simulator(tnc_count, baud, modem_mode, loss, corrupt, queue_limit, txdelay, persist, slot, txtail, random_seed)
+except:
+	print('Unable to create pseudo-terminals.')
+	sys.exit(5)
+
+if baud > 0:
+	print(f'Channel {baud} bits/s {modem_mode}, TXDELAY {txdelay * 10} ms, TXTAIL {txtail * 10} ms, persist {persist}, slot {slot * 10} ms, queue {queue_limit} frames, loss {100 * loss:g}%, corrupt {100 * corrupt:g}%')
+else:
+	print(f'Channel without airtime, loss {100 * loss:g}%, corrupt {100 * corrupt:g}%')
+for tnc in tnc_simulator.tncs:
+	print(f'TNC {tnc.index}: {tnc.device}')
+sys.stdout.flush()
+
+start_time = time.monotonic()
+next_report_time = start_time + report_interval
+
+try:
+	while True:
+		tnc_simulator.poll(0.5)
+		if report_interval > 0 and time.monotonic() >= next_report_time:
+			next_report_time += report_interval
+			PrintReport(tnc_simulator, time.monotonic() - start_time)
+			sys.stdout.flush()
+except KeyboardInterrupt:
+	pass
+
+print('')
+PrintReport(tnc_simulator, time.monotonic() - start_time)
+if json_file_name is not None:
+	try:
+		with open(json_file_name, 'w') as json_file:
+			json.dump({'utilization': tnc_simulator.utilization(), 'tncs': [tnc.report() for tnc in tnc_simulator.tncs]}, json_file, indent=1)
+	except:
+		print(f'Unable to write statistics file {json_file_name}.')
+tnc_simulator.close()